@@ -0,0 +1,320 @@
+# 模拟城堡单画布渲染器 - 把资源、人口、建筑、行业建筑和研究中心面板画在同一个Canvas上
+# 所有文字都是画布上的持久图元，刷新时只对变化的图元调用itemconfigure；
+# 按钮是画出来的矩形，点击和悬停由本类自己做命中测试，不再为每行创建Label/Button控件。
+# 人口、建筑和行业建筑面板与VirtualList一样只为能显示的条目创建图元，条目多时用滚轮或滚动条
+# 滚动，滚动时复用这些图元显示其他条目，规则表再大图元数量也不变。
+import tkinter as tk
+
+import castle_core
+from castle_core import RESOURCE_NAMES, WORKER_RULES, BUILDING_RULES
+
+FONT = ("隶书", 15)
+WIDTH = 960
+ROW_HEIGHT = 34
+TITLE_HEIGHT = 30
+BUTTON_WIDTH = 170
+SOCIETY_WIDTH = 110
+
+# 人口和建筑面板最多显示的行数
+VISIBLE_ROWS = 10
+
+# 滚动条宽度
+TRACK_WIDTH = 6
+
+
+class Window:
+    # 画布上一组可复用的显示位置(人口、建筑面板的行，行业建筑面板的列)
+    # 属性:
+    #   keys: 全部条目的键
+    #   first: 第一个显示的条目下标
+    #   slots: 每个显示位置的(文字图元, 按钮文字图元或None, 点击区域下标)
+    #   area: 滚轮生效的范围(x1, y1, x2, y2)
+    #   track: 滚动条轨道范围(x1, y1, x2, y2)，条目能全部显示时为None
+    #   thumb: 滚动条滑块图元
+    #   vertical: 是否纵向排列
+
+    def __init__(self, keys, count, area, track, vertical=True):
+        self.keys = keys
+        self.first = 0
+        self.count = min(count, len(keys))
+        self.slots = []
+        self.area = area
+        self.track = track if len(keys) > self.count else None
+        self.thumb = None
+        self.vertical = vertical
+
+    def visible(self):
+        # 当前显示的条目键，与slots一一对应
+        return self.keys[self.first:self.first + self.count]
+
+
+class CanvasRenderer:
+    # 单画布渲染器
+    # 属性:
+    #   canvas: 画布
+    #   perform: 执行玩家命令的回调 perform(command, *args)
+    #   tooltip_text: 取提示文字的回调 tooltip_text(key)
+    #   button_text: 取按钮文字的回调 button_text(key)
+    #   refresh: 滚动后刷新面板文字的回调 refresh()
+    #   items: 当前显示的面板键到文字图元ID
+    #   button_items: 当前显示的按钮的面板键到文字图元ID
+    #   windows: 可滚动的面板(Window)
+    #   shown: 图元ID到当前显示的(文字, 颜色)
+    #   regions: 可点击区域 [(x1, y1, x2, y2, 键, 左键回调, 右键回调)]
+    #   hover: 当前悬停的区域键
+    #   status_text: 状态栏当前显示的文字
+
+    def __init__(self, master, perform, tooltip_text, button_text, refresh):
+        # 参数:
+        #   master: 父控件
+        #   perform: 执行玩家命令的回调
+        #   tooltip_text: 取提示文字的回调
+        #   button_text: 取按钮文字的回调
+        #   refresh: 滚动后刷新面板文字的回调
+        self.perform = perform
+        self.tooltip_text = tooltip_text
+        self.button_text = button_text
+        self.refresh = refresh
+        self.items = {}
+        self.button_items = {}
+        self.windows = []
+        self.shown = {}
+        self.regions = []
+        self.hover = None
+        self.status_text = ""
+        self.canvas = tk.Canvas(master, width=WIDTH, highlightthickness=0)
+        self.layout()
+        self.canvas.bind("<Button-1>", self.click)
+        self.canvas.bind("<Button-3>", lambda e: self.click(e, right=True))
+        self.canvas.bind("<Motion>", self.motion)
+        self.canvas.bind("<Leave>", lambda e: self.set_status(None))
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.canvas.bind(sequence, self.wheel)
+
+    def panel(self, x, y, width, height, title):
+        # 画一个带标题的面板边框
+        self.canvas.create_rectangle(x, y + TITLE_HEIGHT // 2, x + width, y + height, outline="gray")
+        title_id = self.canvas.create_text(x + 12, y + TITLE_HEIGHT // 2, text=f" {title} ", font=FONT,
+                                           anchor="w")
+        # 标题下垫一块背景色，挡住边框线
+        self.canvas.create_rectangle(self.canvas.bbox(title_id), fill=self.canvas.cget("background"),
+                                     outline="")
+        self.canvas.tag_raise(title_id)
+
+    def text(self, key, x, y, fill="black"):
+        # 创建一个持久文字图元
+        # 参数:
+        #   key: 面板键，为None时由所在的Window在滚动时分配
+        item = self.canvas.create_text(x, y, text="", font=FONT, anchor="w", fill=fill)
+        if key is not None:
+            self.items[key] = item
+        return item
+
+    def button(self, x, y):
+        # 画一个按钮并预留点击区域，按钮对应的条目和文字由Window在滚动时分配(见fill)
+        # 参数:
+        #   x, y: 左上角坐标
+        # 返回:
+        #   (按钮文字图元, 点击区域下标)
+        x2, y2 = x + BUTTON_WIDTH, y + ROW_HEIGHT - 6
+        self.canvas.create_rectangle(x, y, x2, y2, fill="#f0f0f0", outline="gray")
+        item = self.canvas.create_text((x + x2) // 2, (y + y2) // 2, text="", font=FONT)
+        self.regions.append((x, y, x2, y2, None, None, None))
+        return item, len(self.regions) - 1
+
+    def actions(self, key):
+        # 面板元素的(左键回调, 右键回调)
+        kind, name = key
+        if kind == "worker":
+            return (lambda: self.perform("hire", name), None)
+        if kind == "building":
+            return (lambda: self.perform("build_house", name),
+                    lambda: self.perform("build_house", name, 1, castle_core.PRIORITY_URGENT))
+        return (lambda: self.perform("build_society", name),
+                lambda: self.perform("build_society", name, castle_core.PRIORITY_URGENT))
+
+    def window(self, keys, count, area, track, vertical=True):
+        # 创建一个可滚动的面板，条目放不下时画出滚动条
+        window = Window(keys, count, area, track, vertical)
+        if window.track is not None:
+            self.canvas.create_rectangle(window.track, fill="#e0e0e0", outline="")
+            window.thumb = self.canvas.create_rectangle(window.track, fill="gray", outline="")
+        self.windows.append(window)
+        return window
+
+    def fill(self, window):
+        # 把窗口内的条目分配给各个显示位置的图元和点击区域，并更新滚动条
+        for key in set(self.items) & set(window.keys):
+            del self.items[key]
+            self.button_items.pop(key, None)
+        for key, (item, button_item, region) in zip(window.visible(), window.slots):
+            self.items[key] = item
+            self.shown.pop(item, None)
+            if button_item is not None:
+                self.button_items[key] = button_item
+                self.shown.pop(button_item, None)
+            self.regions[region] = self.regions[region][:4] + (key,) + self.actions(key)
+        if window.thumb is not None:
+            x1, y1, x2, y2 = window.track
+            start, end = window.first / len(window.keys), (window.first + window.count) / len(window.keys)
+            if window.vertical:
+                self.canvas.coords(window.thumb, x1, y1 + (y2 - y1) * start, x2, y1 + (y2 - y1) * end)
+            else:
+                self.canvas.coords(window.thumb, x1 + (x2 - x1) * start, y1, x1 + (x2 - x1) * end, y2)
+
+    def scroll(self, window, first):
+        # 把窗口滚动到第first个条目，然后刷新面板文字
+        first = max(0, min(first, len(window.keys) - window.count))
+        if first == window.first:
+            return
+        window.first = first
+        self.fill(window)
+        self.hover = None
+        self.refresh()
+
+    def scroll_to(self, key):
+        # 滚动到使key显示出来的位置(已经显示时不动)
+        for window in self.windows:
+            if key in window.keys:
+                index = window.keys.index(key)
+                if not window.first <= index < window.first + window.count:
+                    self.scroll(window, index)
+                return
+
+    def layout(self):
+        # 创建所有面板、文字图元和按钮
+        half = WIDTH // 2 - 5
+
+        # 资源信息
+        y = 0
+        height = TITLE_HEIGHT + ROW_HEIGHT * len(RESOURCE_NAMES) + 6
+        self.panel(0, y, WIDTH - 1, height, "资源信息")
+        for i, key in enumerate(RESOURCE_NAMES):
+            self.text(("resource", key), 15, y + TITLE_HEIGHT + ROW_HEIGHT * i + ROW_HEIGHT // 2)
+
+        # 人口信息和建筑信息，只为最多VISIBLE_ROWS行创建图元
+        y += height + 5
+        rows = min(VISIBLE_ROWS, max(len(WORKER_RULES), len(BUILDING_RULES)))
+        height = TITLE_HEIGHT + ROW_HEIGHT * rows + 6
+        self.panel(0, y, half, height, "人口信息")
+        self.panel(half + 10, y, half, height, "建筑信息")
+        top, bottom = y + TITLE_HEIGHT, y + height - 6
+        for keys, x in (([("worker", worker) for worker in WORKER_RULES], 0),
+                        ([("building", building) for building in BUILDING_RULES], half + 10)):
+            window = self.window(keys, rows, (x, y, x + half, y + height),
+                                 (x + half - TRACK_WIDTH - 3, top, x + half - 3, bottom))
+            for i in range(window.count):
+                row_y = top + ROW_HEIGHT * i
+                item = self.text(None, x + 15, row_y + ROW_HEIGHT // 2)
+                window.slots.append((item,) + self.button(x + half - BUTTON_WIDTH - 10, row_y + 3))
+            self.fill(window)
+
+        # 行业建筑，文字本身可点击；一行放不下时横向滚动
+        y += height + 5
+        columns = (WIDTH - 20) // SOCIETY_WIDTH
+        scrolling = len(castle_core.SOCIETY_RULES) > columns
+        height = TITLE_HEIGHT + ROW_HEIGHT + 6 + (TRACK_WIDTH + 4 if scrolling else 0)
+        self.panel(0, y, WIDTH - 1, height, "行业建筑")
+        row_y = y + TITLE_HEIGHT
+        window = self.window([("society", society) for society in castle_core.SOCIETY_RULES], columns,
+                             (0, y, WIDTH, y + height),
+                             (20, row_y + ROW_HEIGHT + 2, WIDTH - 20, row_y + ROW_HEIGHT + 2 + TRACK_WIDTH),
+                             vertical=False)
+        for i in range(window.count):
+            x = 20 + i * SOCIETY_WIDTH
+            item = self.text(None, x, row_y + ROW_HEIGHT // 2, fill="gray")
+            self.regions.append((x, row_y, x + 90, row_y + ROW_HEIGHT, None, None, None))
+            window.slots.append((item, None, len(self.regions) - 1))
+        self.fill(window)
+
+        # 研究中心
+        y += height + 5
+        height = TITLE_HEIGHT + ROW_HEIGHT + 6
+        self.panel(0, y, WIDTH - 1, height, "研究中心")
+        row_y = y + TITLE_HEIGHT
+        self.text(("research", "status"), 20, row_y + ROW_HEIGHT // 2, fill="gray")
+        self.text(("research", "progress"), 150, row_y + ROW_HEIGHT // 2)
+        self.regions.append((20, row_y, 130, row_y + ROW_HEIGHT, ("research", "status"),
+                             lambda: self.perform("build_research"),
+                             lambda: self.perform("build_research", castle_core.PRIORITY_URGENT)))
+
+        # 状态栏: 显示鼠标所指元素的提示
+        y += height + 5
+        self.status = self.canvas.create_text(5, y + ROW_HEIGHT // 2, text="", font=FONT, anchor="w",
+                                              fill="#806000")
+        self.canvas.config(height=y + ROW_HEIGHT)
+
+    def hit(self, x, y):
+        # 命中测试，返回坐标所在的区域，没有时返回None
+        for region in self.regions:
+            if region[0] <= x <= region[2] and region[1] <= y <= region[3]:
+                return region
+        return None
+
+    def click(self, event, right=False):
+        # 处理左键或右键点击；点在滚动条轨道上时向点击的方向翻一页
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        for window in self.windows:
+            if window.track is not None:
+                x1, y1, x2, y2 = window.track
+                if x1 <= x <= x2 and y1 <= y <= y2:
+                    thumb = self.canvas.coords(window.thumb)
+                    before = y < thumb[1] if window.vertical else x < thumb[0]
+                    self.scroll(window, window.first + (-window.count if before else window.count))
+                    return
+        region = self.hit(x, y)
+        if region is None:
+            return
+        callback = region[6] if right else region[5]
+        if callback is not None:
+            callback()
+
+    def motion(self, event):
+        # 鼠标移动时在状态栏显示所指元素的提示
+        region = self.hit(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        self.set_status(region[4] if region is not None else None)
+
+    def wheel(self, event):
+        # 鼠标滚轮滚动所指的面板(Linux上为Button-4/Button-5)
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        for window in self.windows:
+            x1, y1, x2, y2 = window.area
+            if window.track is not None and x1 <= x <= x2 and y1 <= y <= y2:
+                self.scroll(window, window.first + (-1 if up else 1))
+                return
+
+    def set_status(self, key):
+        # 更新状态栏提示，悬停元素没有变化时不做任何事
+        if key == self.hover:
+            return
+        self.hover = key
+        self.refresh_status()
+
+    def refresh_status(self):
+        # 重新生成状态栏提示，文字变化时才更新图元
+        text = self.tooltip_text(self.hover) if self.hover else ""
+        if text != self.status_text:
+            self.status_text = text
+            self.canvas.itemconfigure(self.status, text=text)
+
+    def render(self, texts):
+        # 刷新面板文字，只对变化的图元调用itemconfigure
+        # 参数:
+        #   texts: castle_core.panel_texts的结果(当前显示的条目，见items)
+        for key, value in texts.items():
+            item = self.items[key]
+            if self.shown.get(item) == value:
+                continue
+            self.shown[item] = value
+            text, color = value
+            self.canvas.itemconfigure(item, text=text, fill=color or "black")
+
+    def render_buttons(self):
+        # 刷新按钮文字和状态栏提示(负担时间随资源和工人变化)
+        for key, item in self.button_items.items():
+            text = self.button_text(key)
+            if self.shown.get(item) != text:
+                self.shown[item] = text
+                self.canvas.itemconfigure(item, text=text)
+        self.refresh_status()
@@ -0,0 +1,794 @@
+# 模拟城堡核心逻辑 - 不依赖tkinter的游戏规则与状态
+# 游戏状态是一个普通字典(见new_game)，界面只负责显示和把点击转成下面的动作函数。
+# 动作函数成功时返回None，失败时返回(标题, 提示内容)，由界面决定如何弹窗。
+import collections
+import heapq
+import json
+
+# 资源显示名称
+RESOURCE_NAMES = {
+    "food": "食物",
+    "wood": "木头",
+    "stone": "石头",
+    "iron": "铁矿"
+}
+
+# 工人规则 - name为界面显示名，short为提示中使用的名称，house为居住的建筑
+WORKER_RULES = {
+    "farmer": {"name": "农  民", "short": "农民", "produces": "food",
+               "cost": {"food": 20}, "house": "farm"},
+    "lumber": {"name": "伐木工", "short": "伐木工", "produces": "wood",
+               "cost": {"food": 50}, "house": "lumber"},
+    "quarry": {"name": "采石工", "short": "采石工", "produces": "stone",
+               "cost": {"wood": 50}, "house": "quarry"},
+    "mine": {"name": "铁矿工", "short": "铁矿工", "produces": "iron",
+             "cost": {"stone": 50}, "house": "mine"},
+    "builder": {"name": "建筑工", "short": "建筑工", "produces": None,
+                "cost": {"food": 50, "wood": 50, "stone": 50, "iron": 50}, "house": "worker_house"}
+}
+
+# 建筑规则 - capacity为每栋建筑提供的居住上限，society为建造前需要拥有的行业建筑，
+# work为建造需要的建筑点
+BUILDING_RULES = {
+    "farm": {"name": "农  屋", "short": "农屋", "cost": {"food": 200},
+             "society": "农业社", "capacity": 10, "work": 10},
+    "lumber": {"name": "伐木屋", "short": "伐木屋", "cost": {"wood": 200},
+               "society": "林业社", "capacity": 10, "work": 10},
+    "quarry": {"name": "采石屋", "short": "采石屋", "cost": {"stone": 200},
+               "society": "采石社", "capacity": 10, "work": 10},
+    "mine": {"name": "铁矿屋", "short": "铁矿屋", "cost": {"iron": 200},
+             "society": "铁矿社", "capacity": 10, "work": 10},
+    "worker_house": {"name": "工人房", "short": "工人房",
+                     "cost": {"food": 1000, "wood": 1000, "stone": 500, "iron": 500},
+                     "society": "建筑社", "capacity": 5, "work": 50}
+}
+
+# 行业建筑规则 - capacity为建成后额外提供的居住上限，work为建造需要的建筑点
+SOCIETY_RULES = {
+    "农业社": {"cost": {"food": 120}, "capacity": 10, "work": 10},
+    "林业社": {"cost": {"food": 500}, "capacity": 10, "work": 20},
+    "采石社": {"cost": {"food": 500, "wood": 500}, "capacity": 10, "work": 30},
+    "铁矿社": {"cost": {"food": 500, "wood": 500, "stone": 500}, "capacity": 10, "work": 40},
+    "建筑社": {"cost": {"food": 2000, "wood": 2000, "stone": 1000, "iron": 1000}, "capacity": 5, "work": 60}
+}
+
+# 研究中心规则 - required为建造需要的建筑点
+RESEARCH_RULES = {
+    "cost": {"food": 10000, "wood": 10000, "stone": 5000, "iron": 5000},
+    "required": 500
+}
+
+# 生产资源的工人 - (工人类型, 产出资源)，每名工人每秒生产1单位
+PRODUCERS = [(worker, rule["produces"]) for worker, rule in WORKER_RULES.items() if rule["produces"]]
+
+# 城堡自身每秒提供的建筑点(没有建筑工时也能慢慢建造)，每名建筑工再加1点
+BASE_BUILD_POINTS = 1
+
+# 建造优先级 - 数字越小越先建造
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+
+
+def load_rules(path):
+    # 加载扩展规则(JSON)，把其中的资源、工人、建筑和行业建筑合并进规则表
+    # 文件格式: {"resources": {...}, "workers": {...}, "buildings": {...}, "societies": {...},
+    #            "research": {...}}，
+    # 各项的字段与对应规则表相同，已有的键会被覆盖。加载后再调用new_game创建游戏
+    # 参数:
+    #   path: 规则文件路径
+    with open(path, encoding="utf-8") as f:
+        apply_rules(json.load(f))
+
+
+def apply_rules(rules):
+    # 把规则字典合并进规则表(格式见load_rules)，并检查引用是否有效
+    RESOURCE_NAMES.update(rules.get("resources", {}))
+    SOCIETY_RULES.update(rules.get("societies", {}))
+    BUILDING_RULES.update(rules.get("buildings", {}))
+    WORKER_RULES.update(rules.get("workers", {}))
+    RESEARCH_RULES.update(rules.get("research", {}))
+
+    for name, rule in list(BUILDING_RULES.items()) + list(SOCIETY_RULES.items()) + list(WORKER_RULES.items()):
+        for key in rule["cost"]:
+            if key not in RESOURCE_NAMES:
+                raise ValueError(f"{name}的花费使用了未知资源{key}")
+    for building, rule in BUILDING_RULES.items():
+        if rule["society"] not in SOCIETY_RULES:
+            raise ValueError(f"{building}需要未知的行业建筑{rule['society']}")
+    for worker, rule in WORKER_RULES.items():
+        if rule["house"] not in BUILDING_RULES:
+            raise ValueError(f"{worker}居住在未知的建筑{rule['house']}")
+        if rule["produces"] and rule["produces"] not in RESOURCE_NAMES:
+            raise ValueError(f"{worker}生产未知资源{rule['produces']}")
+    for key in RESEARCH_RULES["cost"]:
+        if key not in RESOURCE_NAMES:
+            raise ValueError(f"研究中心的花费使用了未知资源{key}")
+    PRODUCERS[:] = [(worker, rule["produces"]) for worker, rule in WORKER_RULES.items() if rule["produces"]]
+
+
+def new_game(tick_rate=1):
+    # 创建新游戏的初始状态
+    # 参数:
+    #   tick_rate: 每秒推进的次数(默认1)
+    # 返回:
+    #   包含资源、工人、建筑、行业建筑、研究中心和建造队列的状态字典
+    # 建造队列是按(优先级, 序号)排列的堆，元素为(优先级, 序号, 类型, 目标, 数量, 所需建筑点)；
+    # 已投入的建筑点记录在queue_progress中，pending记录每个目标排队中的数量；
+    # remainder记录还不足一个单位的产量和建筑点(单位为1/tick_rate)，time和subtick记录游戏时间
+    resources = dict.fromkeys(RESOURCE_NAMES, 0)
+    resources["food"] = 150
+    return {
+        "resources": resources,
+        "workers": dict.fromkeys(WORKER_RULES, 0),
+        "buildings": dict.fromkeys(BUILDING_RULES, 0),
+        "industry": dict.fromkeys(SOCIETY_RULES, False),
+        "research": {"built": False, "building": False, "progress": 0,
+                     "required": RESEARCH_RULES["required"]},
+        "queue": [],
+        "queue_progress": {},
+        "queue_seq": 0,
+        "pending": {},
+        "tick_rate": tick_rate,
+        "remainder": dict.fromkeys(list(RESOURCE_NAMES) + ["build"], 0),
+        "time": 0,
+        "subtick": 0
+    }
+
+
+def capacity(state, worker):
+    # 计算某种工人的居住上限
+    # 参数:
+    #   state: 游戏状态
+    #   worker: 工人类型(如"farmer")
+    house = WORKER_RULES[worker]["house"]
+    building = BUILDING_RULES[house]
+    society = building["society"]
+    total = state["buildings"][house] * building["capacity"]
+    if state["industry"][society]:
+        total += SOCIETY_RULES[society]["capacity"]
+    return total
+
+
+def check_cost(resources, cost, purpose="", count=1):
+    # 检查资源是否足够，返回第一个不足的资源提示
+    # 参数:
+    #   resources: 当前资源
+    #   cost: 需要的资源
+    #   purpose: 提示后缀(如"来雇佣农民")
+    #   count: 数量(默认1)
+    for key, amount in cost.items():
+        if resources[key] < amount * count:
+            name = RESOURCE_NAMES[key]
+            return (f"{name}不足", f"需要{amount * count}{name}{purpose}")
+    return None
+
+
+def cost_text(cost):
+    # 把花费格式化为提示文字，如"需要50食物 + 50木头"
+    return "需要" + " + ".join(f"{amount}{RESOURCE_NAMES[key]}" for key, amount in cost.items())
+
+
+def affordable_count(resources, cost):
+    # 计算当前资源最多能支付几次该花费
+    return min(resources[key] // amount for key, amount in cost.items())
+
+
+def action_cost(key):
+    # 面板元素对应动作(雇佣、建造)的花费
+    # 参数:
+    #   key: (面板, 键)，面板为"worker"、"building"、"society"或"research"
+    kind, name = key
+    if kind == "worker":
+        return WORKER_RULES[name]["cost"]
+    if kind == "building":
+        return BUILDING_RULES[name]["cost"]
+    if kind == "society":
+        return SOCIETY_RULES[name]["cost"]
+    return RESEARCH_RULES["cost"]
+
+
+def afford_time(state, cost):
+    # 按当前产量解析计算多久之后负担得起某项花费(考虑未满一个单位的余量，与tick的账目一致)
+    # 参数:
+    #   state: 游戏状态
+    #   cost: 需要的资源
+    # 返回:
+    #   (缺少的资源{资源: 数量}, 秒数)；已经负担得起时为({}, 0)，缺少的资源没有产出时秒数为None
+    rate = state["tick_rate"]
+    resources = state["resources"]
+    production = {}
+    for worker, resource in PRODUCERS:
+        production[resource] = production.get(resource, 0) + state["workers"][worker]
+    shortfall = {}
+    ticks = 0
+    for key, amount in cost.items():
+        missing = amount - resources[key]
+        if missing <= 0:
+            continue
+        shortfall[key] = missing
+        if not production.get(key):
+            ticks = None
+        elif ticks is not None:
+            # 每次推进产出production个1/rate单位
+            need = missing * rate - state["remainder"][key]
+            ticks = max(ticks, -(-need // production[key]))
+    if ticks is None:
+        return shortfall, None
+    return shortfall, -(-ticks // rate)
+
+
+def afford_text(shortfall, seconds):
+    # 把afford_time的结果格式化为提示文字
+    if not shortfall:
+        return "资源已足够"
+    missing = "还缺" + " + ".join(f"{amount}{RESOURCE_NAMES[key]}" for key, amount in shortfall.items())
+    if seconds is None:
+        return f"{missing}，当前没有产出"
+    if seconds >= 60:
+        return f"{missing}，按当前产量{seconds // 60}分{seconds % 60:02d}秒后足够"
+    return f"{missing}，按当前产量{seconds}秒后足够"
+
+
+def action_status(state, key):
+    # 不能再执行的动作(行业建筑和研究中心已建成或正在建造)的状态说明
+    # 参数:
+    #   state: 游戏状态
+    #   key: (面板, 键)
+    # 返回:
+    #   状态说明；动作可以执行时返回None
+    kind, name = key
+    if kind == "society":
+        if state["industry"][name]:
+            return f"已拥有{name}"
+        if state["pending"].get(name):
+            return f"{name}正在建造中"
+    elif kind == "research":
+        research = state["research"]
+        if research["built"]:
+            return "研究中心已建造完成"
+        if research["building"]:
+            return f"研究中心正在建造中 ({research['progress']}/{research['required']})"
+    return None
+
+
+class AffordCache:
+    # afford_time的缓存，只有资源或工人变化时才重新计算
+    # 界面每次刷新时调用一次update；未满一个单位的余量不计入，否则每次推进都会使缓存失效，
+    # 余量只在重新计算时使用(结果最多相差不到一秒，资源下一次变化时更正)
+    # 属性:
+    #   stamp: 计算缓存结果时的推进频率、资源和工人数量
+    #   results: 面板键到afford_time的结果
+
+    def __init__(self):
+        self.stamp = None
+        self.results = {}
+
+    def update(self, state):
+        # 检查资源和工人是否变化，变化时清空缓存(每次界面刷新调用一次)
+        stamp = (state["tick_rate"], tuple(state["resources"].values()), tuple(state["workers"].values()))
+        if stamp != self.stamp:
+            self.stamp = stamp
+            self.results.clear()
+
+    def get(self, state, key):
+        # 取面板元素对应动作的(缺少的资源, 秒数)
+        result = self.results.get(key)
+        if result is None:
+            result = self.results[key] = afford_time(state, action_cost(key))
+        return result
+
+
+def pay(resources, cost, count=1):
+    # 扣除资源
+    for key, amount in cost.items():
+        resources[key] -= amount * count
+
+
+def hire(state, worker, count=1):
+    # 雇佣工人
+    # 参数:
+    #   state: 游戏状态
+    #   worker: 工人类型
+    #   count: 雇佣数量(默认1，快进模拟时批量雇佣)
+    rule = WORKER_RULES[worker]
+    if state["workers"][worker] + count > capacity(state, worker):
+        house = BUILDING_RULES[rule["house"]]["short"]
+        return ("居住空间不足", f"没有足够的{house}来容纳更多{rule['short']}")
+    error = check_cost(state["resources"], rule["cost"], f"来雇佣{rule['short']}", count)
+    if error:
+        return error
+    pay(state["resources"], rule["cost"], count)
+    state["workers"][worker] += count
+    return None
+
+
+def enqueue(state, kind, target, count, required, priority):
+    # 把建造项目加入建造队列(资源已经扣除)
+    # 参数:
+    #   state: 游戏状态
+    #   kind: 项目类型("house"、"society"或"research")
+    #   target: 建造目标(建筑类型、行业建筑名称或"研究中心")
+    #   count: 数量
+    #   required: 所需建筑点
+    #   priority: 优先级
+    state["queue_seq"] += 1
+    heapq.heappush(state["queue"], (priority, state["queue_seq"], kind, target, count, required))
+    state["pending"][target] = state["pending"].get(target, 0) + count
+
+
+def build_house(state, building, count=1, priority=PRIORITY_NORMAL):
+    # 下单建造居住建筑，资源立即扣除，建筑工完成后增加居住上限
+    # 参数:
+    #   state: 游戏状态
+    #   building: 建筑类型(如"farm")
+    #   count: 建造数量(默认1，快进模拟时批量建造)
+    #   priority: 建造优先级
+    rule = BUILDING_RULES[building]
+    society = rule["society"]
+    if not state["industry"][society]:
+        return (f"缺少{society}", f"需要先建造{society}才能建造{rule['short']}")
+    error = check_cost(state["resources"], rule["cost"], f"来建造{rule['short']}", count)
+    if error:
+        return error
+    pay(state["resources"], rule["cost"], count)
+    enqueue(state, "house", building, count, rule["work"] * count, priority)
+    return None
+
+
+def build_society(state, society, priority=PRIORITY_NORMAL):
+    # 下单建造一座行业建筑
+    # 参数:
+    #   state: 游戏状态
+    #   society: 行业建筑名称(如"农业社")
+    #   priority: 建造优先级
+    if state["industry"][society]:
+        return ("提示", f"已拥有{society}，不能再建造")
+    if state["pending"].get(society):
+        return ("提示", f"{society}正在建造中")
+    rule = SOCIETY_RULES[society]
+    error = check_cost(state["resources"], rule["cost"], f"来建造{society}")
+    if error:
+        return error
+    pay(state["resources"], rule["cost"])
+    enqueue(state, "society", society, 1, rule["work"], priority)
+    return None
+
+
+def build_research(state, priority=PRIORITY_NORMAL):
+    # 下单建造研究中心，之后由建筑工推进进度
+    research = state["research"]
+    if research["built"]:
+        return ("提示", "研究中心已建造完成")
+    if research["building"]:
+        return ("提示", "研究中心正在建造中")
+    error = check_cost(state["resources"], RESEARCH_RULES["cost"])
+    if error:
+        return error
+    pay(state["resources"], RESEARCH_RULES["cost"])
+    research["building"] = True
+    enqueue(state, "research", "研究中心", 1, research["required"], priority)
+    return None
+
+
+def complete(state, kind, target, count):
+    # 建造项目完成，返回对应的事件名
+    state["pending"][target] -= count
+    if not state["pending"][target]:
+        del state["pending"][target]
+    if kind == "house":
+        state["buildings"][target] += count
+        return "house_done"
+    if kind == "society":
+        state["industry"][target] = True
+        return "society_done"
+    research = state["research"]
+    research["progress"] = research["required"]
+    research["built"] = True
+    research["building"] = False
+    return "research_done"
+
+
+def work_queue(state, points):
+    # 把建筑点按优先级分配给建造队列: 先填满堆顶项目，多余的建筑点继续给下一个
+    # 每完成一个项目出堆一次，代价为O(log n)
+    # 参数:
+    #   state: 游戏状态
+    #   points: 本次可用的建筑点
+    # 返回:
+    #   完成项目产生的事件列表
+    events = []
+    queue = state["queue"]
+    progress = state["queue_progress"]
+    while points > 0 and queue:
+        priority, seq, kind, target, count, required = queue[0]
+        done = progress.get(seq, 0)
+        spent = min(points, required - done)
+        done += spent
+        points -= spent
+        if kind == "research":
+            state["research"]["progress"] = done
+        if done >= required:
+            heapq.heappop(queue)
+            progress.pop(seq, None)
+            events.append(complete(state, kind, target, count))
+        else:
+            progress[seq] = done
+    return events
+
+
+def queue_preview(state, limit=8):
+    # 按建造顺序取出队列前limit个项目及其进度，不修改队列
+    # 返回:
+    #   [(类型, 目标, 数量, 已投入建筑点, 所需建筑点)]
+    progress = state["queue_progress"]
+    return [(kind, target, count, progress.get(seq, 0), required)
+            for priority, seq, kind, target, count, required in heapq.nsmallest(limit, state["queue"])]
+
+
+def panel_keys():
+    # 所有面板元素的键，顺序即显示顺序
+    return ([("resource", key) for key in RESOURCE_NAMES]
+            + [("worker", worker) for worker in WORKER_RULES]
+            + [("building", building) for building in BUILDING_RULES]
+            + [("society", society) for society in SOCIETY_RULES]
+            + [("research", "status"), ("research", "progress")])
+
+
+def panel_text(state, key):
+    # 生成一个面板元素要显示的文字，各种前端共用
+    # 参数:
+    #   state: 游戏状态
+    #   key: (面板, 键)，面板为"resource"、"worker"、"building"、"society"或"research"
+    # 返回:
+    #   (文字, 颜色)，颜色为None时使用默认颜色
+    kind, name = key
+    if kind == "resource":
+        if state["tick_rate"] > 1:
+            return (f"{RESOURCE_NAMES[name]}: {resource_value(state, name):.1f}", None)
+        return (f"{RESOURCE_NAMES[name]}: {state['resources'][name]}", None)
+
+    if kind == "worker":
+        rule = WORKER_RULES[name]
+        return (f"{rule['name']}: {state['workers'][name]:04d}/{capacity(state, name):04d}", None)
+
+    pending = state["pending"]
+    if kind == "building":
+        text = f"{BUILDING_RULES[name]['name']}: {state['buildings'][name]:03d}"
+        if pending.get(name):
+            text += f" (+{pending[name]})"
+        return (text, None)
+
+    if kind == "society":
+        if state["industry"][name]:
+            return (name, "green")
+        return (name, "orange" if pending.get(name) else "gray")
+
+    research = state["research"]
+    if name == "status":
+        if research["built"]:
+            return ("已完成", "green")
+        if research["building"]:
+            return ("建造中.", "orange")
+        return ("开始建造", "gray")
+    if research["built"]:
+        return (f"进度: {research['required']}/{research['required']}", None)
+    if research["building"]:
+        return (f"进度: {research['progress']}/{research['required']}", None)
+    return ("", None)
+
+
+def panel_texts(state, keys=None):
+    # 生成多个面板元素的文字
+    # 参数:
+    #   state: 游戏状态
+    #   keys: 要生成的键(默认全部)
+    # 返回:
+    #   {(面板, 键): (文字, 颜色)}
+    if keys is None:
+        keys = panel_keys()
+    return {key: panel_text(state, key) for key in keys}
+
+
+def queue_lines(state, limit=8):
+    # 把建造队列前limit个项目格式化为文字行(含进度条)
+    lines = []
+    for kind, target, count, done, required in queue_preview(state, limit):
+        name = BUILDING_RULES[target]["short"] if kind == "house" else target
+        filled = done * 10 // required
+        lines.append(f"{name} x{count} [{'#' * filled}{'-' * (10 - filled)}] {done}/{required}")
+    if len(state["queue"]) > limit:
+        lines.append(f"...还有{len(state['queue']) - limit}项")
+    return lines
+
+
+def cheat(state):
+    # 作弊: 所有资源增加1000
+    for key in state["resources"]:
+        state["resources"][key] += 1000
+
+
+# 玩家命令 - 命令名到动作函数，供界面、模拟进程等统一调用
+ACTIONS = {
+    "hire": hire,
+    "build_house": build_house,
+    "build_society": build_society,
+    "build_research": build_research,
+    "cheat": cheat
+}
+
+
+def perform(state, history, command, *args):
+    # 执行一条玩家命令(包括撤销和分支)，成功的动作记入撤销历史
+    # 参数:
+    #   state: 游戏状态
+    #   history: 撤销历史(History)
+    #   command: 命令名(ACTIONS中的键，或"undo"、"save_branch"、"switch_branch")
+    #   args: 命令参数
+    # 返回:
+    #   成功时返回None，失败时返回(标题, 提示内容)
+    if command == "undo":
+        if not history.snapshots:
+            return ("提示", "没有可以撤销的操作")
+        return history.undo(state)
+    if command == "save_branch":
+        history.save_branch(state, args[0])
+        return None
+    if command == "switch_branch":
+        if args[0] not in history.branches:
+            return ("提示", f"没有名为{args[0]}的分支")
+        history.switch_branch(state, args[0])
+        return None
+
+    # 先取执行前的快照，动作成功后才记入历史: 失败或出错的动作不会挤掉最早的有效快照
+    snap = history.take(state)
+    error = ACTIONS[command](state, *args)
+    if error is None:
+        history.record(state, (command,) + args, snap)
+    return error
+
+
+def tick(state, ticks=1):
+    # 推进ticks次(每次1/tick_rate秒): 工人生产资源，建筑点分配给建造队列
+    # 每秒产量先按1/tick_rate为单位累加到remainder中，凑满一个整单位才记入资源，
+    # 因此无论每秒推进多少次，资源账目都与每秒推进一次完全一致；ticks较大时一次算完，代价不随ticks增加
+    # 参数:
+    #   state: 游戏状态
+    #   ticks: 推进次数(默认1)
+    # 返回:
+    #   期间发生的事件列表(如"research_done")
+    rate = state["tick_rate"]
+    resources = state["resources"]
+    workers = state["workers"]
+    remainder = state["remainder"]
+    for worker, resource in PRODUCERS:
+        count = workers[worker]
+        if count:
+            total = remainder[resource] + count * ticks
+            if total >= rate:
+                whole, total = divmod(total, rate)
+                resources[resource] += whole
+            remainder[resource] = total
+
+    events = []
+    total = remainder["build"] + (BASE_BUILD_POINTS + workers["builder"]) * ticks
+    if total >= rate:
+        points, total = divmod(total, rate)
+        events = work_queue(state, points)
+    remainder["build"] = total
+
+    total = state["subtick"] + ticks
+    if total >= rate:
+        seconds, total = divmod(total, rate)
+        state["time"] += seconds
+    state["subtick"] = total
+    return events
+
+
+def advance(state, seconds):
+    # 快进若干秒(无界面模拟)
+    # 返回:
+    #   期间发生的全部事件
+    return tick(state, seconds * state["tick_rate"])
+
+
+def set_tick_rate(state, rate):
+    # 修改每秒推进次数，未满一个单位的余量按新单位换算(舍去不足新单位的部分)
+    old = state["tick_rate"]
+    for key in state["remainder"]:
+        state["remainder"][key] = state["remainder"][key] * rate // old
+    state["subtick"] = state["subtick"] * rate // old
+    state["tick_rate"] = rate
+
+
+def resource_value(state, key):
+    # 资源的显示值，包含未满一个单位的余量(用于平滑显示)
+    return state["resources"][key] + state["remainder"][key] / state["tick_rate"]
+
+
+def snapshot(state, previous=None):
+    # 生成状态快照
+    # 每个分区(字典或队列)浅拷贝一次；与上一快照内容相同的分区直接复用上一快照的对象(结构共享)，
+    # 快照生成后不再被修改，因此多个快照可以安全地共享同一分区
+    # 参数:
+    #   state: 游戏状态
+    #   previous: 上一个快照(可选)
+    snap = {}
+    for key, section in state.items():
+        if isinstance(section, (dict, list)):
+            if previous is not None and previous.get(key) == section:
+                snap[key] = previous[key]
+            else:
+                snap[key] = type(section)(section)
+        else:
+            snap[key] = section
+    return snap
+
+
+def restore(state, snap):
+    # 把快照写回状态，分区字典原地更新，界面持有的引用保持有效
+    for key, section in snap.items():
+        if isinstance(section, dict):
+            state[key].clear()
+            state[key].update(section)
+        elif isinstance(section, list):
+            state[key][:] = section
+        else:
+            state[key] = section
+
+
+def rewind(state, snap):
+    # 回到快照中的局面，但游戏时间继续向前(不随快照倒退)，
+    # 这样存档日志按时间恢复时不会混入已经放弃的局面
+    rate = state["tick_rate"]
+    clock = state["time"], state["subtick"]
+    restore(state, snap)
+    set_tick_rate(state, rate)
+    state["time"], state["subtick"] = clock
+
+
+def cancel(state, seq):
+    # 取消建造队列中的一个项目并退还花费，已投入的建筑点不退还
+    # 参数:
+    #   state: 游戏状态
+    #   seq: 项目序号
+    # 返回:
+    #   成功时返回None，项目已经建成时返回(标题, 提示内容)
+    queue = state["queue"]
+    for index, (priority, entry_seq, kind, target, count, required) in enumerate(queue):
+        if entry_seq == seq:
+            break
+    else:
+        return ("提示", "该项目已经建造完成，无法撤销")
+    queue[index] = queue[-1]
+    queue.pop()
+    heapq.heapify(queue)
+    state["queue_progress"].pop(seq, None)
+    state["pending"][target] -= count
+    if not state["pending"][target]:
+        del state["pending"][target]
+    if kind == "house":
+        cost = BUILDING_RULES[target]["cost"]
+    elif kind == "society":
+        cost = SOCIETY_RULES[target]["cost"]
+    else:
+        cost = RESEARCH_RULES["cost"]
+        state["research"]["building"] = False
+        state["research"]["progress"] = 0
+    pay(state["resources"], cost, -count)
+    return None
+
+
+def revert(state, action, snap):
+    # 撤销一个已执行的动作: 退还花费并取消它的效果，游戏时间和此后的产出都保留
+    # 参数:
+    #   state: 游戏状态
+    #   action: 动作(命令名, 参数...)
+    #   snap: 动作执行前的快照
+    # 返回:
+    #   成功时返回None，无法撤销时返回(标题, 提示内容)
+    command, args = action[0], action[1:]
+    if command == "hire":
+        worker = args[0]
+        count = args[1] if len(args) > 1 else 1
+        state["workers"][worker] -= count
+        pay(state["resources"], WORKER_RULES[worker]["cost"], -count)
+    elif command == "cheat":
+        for key in state["resources"]:
+            state["resources"][key] = max(0, state["resources"][key] - 1000)
+    elif command.startswith("build_"):
+        # 下单时新建的项目序号紧接在执行前的queue_seq之后
+        return cancel(state, snap["queue_seq"] + 1)
+    else:
+        rewind(state, snap)
+    return None
+
+
+def fork(snap):
+    # 从快照复制出一个独立的新状态(用于"如果现在建造..."的分支)
+    state = {}
+    for key, section in snap.items():
+        state[key] = type(section)(section) if isinstance(section, (dict, list)) else section
+    return state
+
+
+def diff(snap, state):
+    # 计算快照到当前状态的变化，只包含变化的字段
+    # 字典分区只记录变化的键，被删除的键记为None；队列和其他值变化时整体记录
+    # 参数:
+    #   snap: 旧快照
+    #   state: 当前状态
+    # 返回:
+    #   {分区: 变化}，没有变化时为空字典
+    delta = {}
+    for key, section in state.items():
+        old = snap.get(key)
+        if old is section or old == section:
+            continue
+        if isinstance(section, dict) and isinstance(old, dict):
+            changes = {name: value for name, value in section.items() if old.get(name) != value or name not in old}
+            for name in old:
+                if name not in section:
+                    changes[name] = None
+            delta[key] = changes
+        else:
+            delta[key] = type(section)(section) if isinstance(section, (dict, list)) else section
+    return delta
+
+
+def apply_diff(state, delta):
+    # 把diff的结果应用到状态上
+    for key, changes in delta.items():
+        section = state.get(key)
+        if isinstance(section, dict) and isinstance(changes, dict):
+            for name, value in changes.items():
+                if value is None:
+                    section.pop(name, None)
+                else:
+                    section[name] = value
+        elif isinstance(section, list):
+            section[:] = changes
+        else:
+            state[key] = changes
+
+
+class History:
+    # 有上限的撤销历史与分支记录
+    # 属性:
+    #   snapshots: 撤销快照队列，超出上限时自动丢弃最早的快照
+    #   branches: 命名分支快照
+
+    def __init__(self, limit=100):
+        # 参数:
+        #   limit: 最多保留的撤销快照数量(默认100)
+        self.snapshots = collections.deque(maxlen=limit)
+        self.branches = {}
+
+    def take(self, state):
+        # 取当前状态的快照(与最近的撤销快照共享未变化的部分)，不记入历史
+        previous = self.snapshots[-1][1] if self.snapshots else None
+        return snapshot(state, previous)
+
+    def record(self, state, action, snap=None):
+        # 记录动作执行前的状态
+        # 参数:
+        #   state: 游戏状态
+        #   action: 动作(命令名, 参数...)，撤销时据此退还花费(见revert)
+        #   snap: 执行前已取好的快照(见take)，不给出时使用当前状态
+        self.snapshots.append((action, snap if snap is not None else self.take(state)))
+
+    def undo(self, state):
+        # 撤销最近一次动作(见revert)；无法撤销的动作(如已建成的项目)同样移出历史
+        # 返回:
+        #   成功时返回None，无法撤销时返回(标题, 提示内容)
+        action, snap = self.snapshots.pop()
+        return revert(state, action, snap)
+
+    def save_branch(self, state, name):
+        # 把当前状态保存为命名分支
+        previous = self.snapshots[-1][1] if self.snapshots else None
+        self.branches[name] = snapshot(state, previous)
+
+    def switch_branch(self, state, name):
+        # 切换到命名分支(游戏时间不倒退)；切换前的状态记入撤销历史
+        self.record(state, ("switch_branch", name))
+        rewind(state, self.branches[name])
@@ -0,0 +1,323 @@
+# 模拟城堡终端前端 - 基于curses，不需要图形界面，适合通过SSH在服务器上游玩或监控
+# 默认在本进程内运行一局游戏；使用 --connect=主机:端口 时连接castle_server，
+# 加上 --colony=编号 可以监控已有的殖民地(不指定则新建一个)。
+# 每帧只重写内容有变化的行，curses再只把变化的字符发送到终端。
+#
+# 按键: 上下方向键/jk 选择  回车/空格 雇佣或建造  p 优先建造  u 撤销  q 退出
+#
+# 用法: python castle_curses.py [--tick-rate=N] [--rules=规则文件] [--connect=127.0.0.1:8765] [--colony=1]
+import curses
+import json
+import locale
+import select
+import socket
+import sys
+import time
+import unicodedata
+
+import castle_core
+
+# 帧间隔(毫秒)
+FRAME_MS = 100
+
+# 向服务器发送命令的最长等待时间(秒)，超时视为连接断开
+SEND_TIMEOUT = 5
+
+
+class LocalBackend:
+    # 在本进程内运行游戏
+    # 属性:
+    #   state: 游戏状态
+    #   history: 撤销历史
+    #   messages: 待显示的提示
+
+    def __init__(self, tick_rate=1):
+        self.state = castle_core.new_game(tick_rate)
+        self.history = castle_core.History(limit=100)
+        self.messages = []
+        self.start = time.monotonic()
+        self.done = 0
+
+    def update(self):
+        # 按真实时间推进游戏
+        due = int((time.monotonic() - self.start) * self.state["tick_rate"]) - self.done
+        if due > 0:
+            self.done += due
+            if "research_done" in castle_core.tick(self.state, due):
+                self.messages.append("研究中心建造完成！")
+
+    def perform(self, command, *args):
+        # 执行玩家命令
+        error = castle_core.perform(self.state, self.history, command, *args)
+        if error:
+            self.messages.append(f"{error[0]}: {error[1]}")
+
+
+class RemoteBackend:
+    # 连接castle_server，订阅某个殖民地的状态变化
+    # 属性:
+    #   state: 本地保存的殖民地状态(由服务器推送的变化更新)
+    #   messages: 待显示的提示
+    #   connected: 连接是否仍然可用，断开后不再读取
+
+    def __init__(self, address, colony=None):
+        # 参数:
+        #   address: "主机:端口"
+        #   colony: 殖民地编号(可选，不指定时新建)
+        host, _, port = address.rpartition(":")
+        self.sock = socket.create_connection((host or "127.0.0.1", int(port)))
+        self.buffer = b""
+        self.messages = []
+        self.connected = True
+        if colony is None:
+            colony = self.request({"op": "create"})["colony"]
+        self.colony = colony
+        reply = self.request({"op": "subscribe", "colony": colony})
+        if not reply["ok"]:
+            raise SystemExit(reply["error"])
+        self.state = reply["state"]
+        self.normalize(self.state)
+        # 发送保持阻塞(有超时)，读取前先用select确认有数据，界面不会因读取而卡住
+        self.sock.settimeout(SEND_TIMEOUT)
+
+    def request(self, message):
+        # 发送请求并等待回复(只在连接建立时使用)
+        self.sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        while b"\n" not in self.buffer:
+            self.buffer += self.sock.recv(65536)
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def normalize(self, section):
+        # JSON中字典的键都是字符串，把建造进度的序号转回整数
+        progress = section.get("queue_progress")
+        if progress:
+            section["queue_progress"] = {int(seq): done for seq, done in progress.items()}
+
+    def update(self):
+        # 读取服务器推送的所有消息
+        try:
+            while self.connected and select.select([self.sock], [], [], 0)[0]:
+                data = self.sock.recv(65536)
+                if not data:
+                    self.disconnect()
+                    break
+                self.buffer += data
+        except OSError:
+            self.disconnect()
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            message = json.loads(line)
+            if message.get("event") == "delta":
+                delta = message["delta"]
+                self.normalize(delta)
+                castle_core.apply_diff(self.state, delta)
+            elif message.get("event") == "dropped":
+                # 接收太慢被服务器取消了订阅: 重新订阅，回复中带有完整状态
+                self.messages.append("接收过慢，已重新订阅")
+                self.send({"op": "subscribe", "colony": self.colony})
+            elif "state" in message:
+                self.state = message["state"]
+                self.normalize(self.state)
+            elif not message.get("ok"):
+                error = message["error"]
+                self.messages.append(": ".join(error) if isinstance(error, list) else error)
+
+    def perform(self, command, *args):
+        # 把玩家命令发给服务器，结果在update中处理
+        self.send({"op": "command", "colony": self.colony, "command": command, "args": list(args)})
+
+    def send(self, message):
+        # 发送一条请求，不等待回复；连接已断开或发送超时时只显示提示
+        if not self.connected:
+            self.messages.append("与服务器的连接已断开，命令没有发出")
+            return
+        try:
+            self.sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        except OSError:
+            self.disconnect()
+
+    def disconnect(self):
+        # 连接断开: 提示一次，之后不再读取
+        if self.connected:
+            self.connected = False
+            self.messages.append("与服务器的连接已断开")
+            self.sock.close()
+
+
+def fit(text, width):
+    # 按终端列数截断或补齐文字
+    result = []
+    used = 0
+    for char in text:
+        char_width = 2 if unicodedata.east_asian_width(char) in "WF" else 1
+        if used + char_width > width:
+            break
+        result.append(char)
+        used += char_width
+    return "".join(result) + " " * (width - used)
+
+
+class Frontend:
+    # 终端界面
+    # 属性:
+    #   screen: curses窗口
+    #   backend: LocalBackend或RemoteBackend
+    #   rows: 可选择的行 [(面板键, 动作)]，标题行的动作为None
+    #   cursor: 当前选择的行
+    #   top: 列表第一行显示的下标
+    #   lines: 屏幕每一行上一次写入的(文字, 属性)
+
+    def __init__(self, screen, backend):
+        self.screen = screen
+        self.backend = backend
+        self.cursor = 0
+        self.top = 0
+        self.lines = {}
+        self.message = ""
+        self.rows = []
+        titles = {"worker": "人口信息", "building": "建筑信息", "society": "行业建筑", "research": "研究中心"}
+        for key in castle_core.panel_keys():
+            kind = key[0]
+            if kind == "resource" or key == ("research", "progress"):
+                continue
+            if kind in titles:
+                self.rows.append((("title", titles.pop(kind)), None))
+            self.rows.append((key, kind))
+        self.cursor = self.next_row(0, 1)
+
+        curses.curs_set(0)
+        curses.start_color()
+        curses.use_default_colors()
+        curses.init_pair(1, curses.COLOR_GREEN, -1)
+        curses.init_pair(2, curses.COLOR_YELLOW, -1)
+        self.colors = {"green": curses.color_pair(1), "orange": curses.color_pair(2), "gray": curses.A_DIM}
+        self.screen.timeout(FRAME_MS)
+
+    def next_row(self, index, step):
+        # 从index开始沿step方向找到下一个可选择的行
+        while 0 <= index < len(self.rows) and self.rows[index][1] is None:
+            index += step
+        return index if 0 <= index < len(self.rows) else self.cursor
+
+    def act(self, urgent=False):
+        # 对当前选择的行执行雇佣或建造
+        (kind, name), _ = self.rows[self.cursor]
+        priority = castle_core.PRIORITY_URGENT if urgent else castle_core.PRIORITY_NORMAL
+        if kind == "worker":
+            self.backend.perform("hire", name)
+        elif kind == "building":
+            self.backend.perform("build_house", name, 1, priority)
+        elif kind == "society":
+            self.backend.perform("build_society", name, priority)
+        elif kind == "research":
+            self.backend.perform("build_research", priority)
+
+    def handle(self, key):
+        # 处理按键，返回False时退出
+        if key in (ord("q"), ord("Q")):
+            return False
+        if key in (curses.KEY_UP, ord("k")):
+            self.cursor = self.next_row(self.cursor - 1, -1)
+        elif key in (curses.KEY_DOWN, ord("j")):
+            self.cursor = self.next_row(self.cursor + 1, 1)
+        elif key in (curses.KEY_ENTER, 10, 13, ord(" ")):
+            self.act()
+        elif key == ord("p"):
+            self.act(urgent=True)
+        elif key == ord("u"):
+            self.backend.perform("undo")
+        return True
+
+    def put(self, y, text, attr=0):
+        # 写入一行，内容和属性没有变化时跳过
+        height, width = self.screen.getmaxyx()
+        if y >= height:
+            return
+        if self.lines.get(y) == (text, attr):
+            return
+        self.lines[y] = (text, attr)
+        try:
+            self.screen.addstr(y, 0, fit(text, width - 1), attr)
+        except curses.error:
+            pass
+
+    def draw(self):
+        # 绘制一帧
+        state = self.backend.state
+        height, width = self.screen.getmaxyx()
+        if self.backend.messages:
+            self.message = self.backend.messages[-1]
+            self.backend.messages.clear()
+
+        self.put(0, f"模拟城堡  时间: {state['time']}秒", curses.A_BOLD)
+        resources = "  ".join(castle_core.panel_text(state, ("resource", key))[0]
+                              for key in castle_core.RESOURCE_NAMES)
+        self.put(1, resources)
+
+        # 中间是可滚动的面板列表，底部留给建造队列和提示
+        queue = castle_core.queue_lines(state, 4)
+        list_height = max(1, height - 5 - len(queue))
+        if self.cursor < self.top:
+            self.top = self.cursor
+        elif self.cursor >= self.top + list_height:
+            self.top = self.cursor - list_height + 1
+        for i in range(list_height):
+            index = self.top + i
+            if index >= len(self.rows):
+                self.put(2 + i, "")
+                continue
+            key, action = self.rows[index]
+            if action is None:
+                self.put(2 + i, f"[{key[1]}]", curses.A_BOLD)
+                continue
+            text, color = castle_core.panel_text(state, key)
+            if key == ("research", "status"):
+                text += "  " + castle_core.panel_text(state, ("research", "progress"))[0]
+            attr = self.colors.get(color, 0)
+            if index == self.cursor:
+                attr |= curses.A_REVERSE
+            self.put(2 + i, ("> " if index == self.cursor else "  ") + text, attr)
+
+        y = 2 + list_height
+        self.put(y, "[建造队列] " + ("" if queue else "队列为空"), curses.A_BOLD)
+        for i, line in enumerate(queue):
+            self.put(y + 1 + i, "  " + line)
+        self.put(height - 2, self.message, self.colors["orange"])
+        self.put(height - 1, "上下选择  回车雇佣/建造  p优先建造  u撤销  q退出", curses.A_DIM)
+        self.screen.noutrefresh()
+        curses.doupdate()
+
+    def run(self):
+        # 主循环: 读取按键、推进游戏、绘制
+        while True:
+            key = self.screen.getch()
+            if key == curses.KEY_RESIZE:
+                self.lines.clear()
+                self.screen.clear()
+            elif key != -1 and not self.handle(key):
+                return
+            self.backend.update()
+            self.draw()
+
+
+def main():
+    # 解析命令行参数并启动终端界面
+    options = {}
+    for arg in sys.argv[1:]:
+        name, _, value = arg.lstrip("-").partition("=")
+        options[name] = value
+    if "connect" in options:
+        colony = int(options["colony"]) if "colony" in options else None
+        backend = RemoteBackend(options["connect"], colony)
+    else:
+        if "rules" in options:
+            castle_core.load_rules(options["rules"])
+        backend = LocalBackend(max(1, int(options.get("tick-rate", 1))))
+
+    locale.setlocale(locale.LC_ALL, "")
+    curses.wrapper(lambda screen: Frontend(screen, backend).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# 模拟城堡多殖民地对比面板 - 同时加载多个存档(castle_save存档目录)，
+# 在一张表中列出资源、每秒产量、按当前速度建成研究中心的时间和排名。
+#
+# 读取和分析存档在线程池中进行，Tk线程只负责显示。每个存档的分析结果按存档文件的
+# 修改时间和大小缓存(有数量上限的LRU)，存档没有变化时刷新只需要读取文件状态。
+#
+# 用法: python castle_dashboard.py [--refresh=5] [--rules=规则文件] 存档目录...
+#   存档目录也可以是包含多个存档目录的上级目录
+import collections
+import concurrent.futures
+import os
+import sys
+import threading
+import tkinter as tk
+import zlib
+from tkinter import filedialog
+from tkinter import ttk
+
+import castle_core
+import castle_save
+
+# 分析结果缓存的最大条目数
+CACHE_SIZE = 1024
+
+# 读取存档的线程数
+READ_THREADS = 8
+
+# 自动刷新间隔(秒)
+REFRESH_SECONDS = 5
+
+
+def analyze(state):
+    # 分析一个殖民地
+    # 参数:
+    #   state: 游戏状态
+    # 返回:
+    #   {"time": 游戏时间, "resources": 资源, "rates": 每秒产量, "eta": 研究中心建成还需的秒数}，
+    #   eta为0表示已建成，为None表示按当前产量无法建成
+    rates = dict.fromkeys(castle_core.RESOURCE_NAMES, 0)
+    for worker, resource in castle_core.PRODUCERS:
+        rates[resource] += state["workers"].get(worker, 0)
+    research = state["research"]
+    points = castle_core.BASE_BUILD_POINTS + state["workers"].get("builder", 0)
+    # 建造队列按(优先级, 序号)依次施工，排在研究中心前面的条目先消耗建筑点；
+    # 研究中心还没有排队时，下单后会以普通优先级排在现有的所有条目之后
+    progress = state["queue_progress"]
+    position = next((entry[:2] for entry in state["queue"] if entry[2] == "research"), None)
+    ahead = sum(required - progress.get(seq, 0)
+                for priority, seq, kind, target, count, required in state["queue"]
+                if position is None or (priority, seq) < position)
+    if research["built"]:
+        eta = 0
+    elif research["building"]:
+        eta = -(-(ahead + research["required"] - research["progress"]) // points)
+    else:
+        _, eta = castle_core.afford_time(state, castle_core.RESEARCH_RULES["cost"])
+        if eta is not None:
+            # 攒资源期间建筑工已经在施工前面的条目
+            ahead = max(0, ahead - eta * points)
+            eta += -(-(ahead + research["required"]) // points)
+    return {"time": state["time"], "resources": dict(state["resources"]), "rates": rates, "eta": eta}
+
+
+def signature(path):
+    # 存档目录的签名: 每个段文件的名称、修改时间和大小，存档变化时签名随之变化
+    result = []
+    for _, filename in castle_save.segment_files(path):
+        stat = os.stat(filename)
+        result.append((filename, stat.st_mtime_ns, stat.st_size))
+    return tuple(result)
+
+
+def find_saves(paths):
+    # 展开路径列表: 本身是存档目录的直接使用，否则使用其中的存档目录
+    saves = []
+    for path in paths:
+        if not os.path.isdir(path):
+            continue
+        if castle_save.segment_files(path):
+            saves.append(path)
+            continue
+        for name in sorted(os.listdir(path)):
+            child = os.path.join(path, name)
+            if os.path.isdir(child) and castle_save.segment_files(child):
+                saves.append(child)
+    return saves
+
+
+class SaveCache:
+    # 存档分析结果的LRU缓存，线程池中的多个线程共用
+    # 属性:
+    #   entries: 存档目录到(签名, 分析结果)，按最近使用排序
+    #   size: 最大条目数
+
+    def __init__(self, size=CACHE_SIZE):
+        self.entries = collections.OrderedDict()
+        self.size = size
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        # 取得存档的分析结果，存档没有变化时直接使用缓存(在线程池中调用)
+        # 返回:
+        #   分析结果；存档无法读取时返回None
+        key = signature(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == key:
+                self.entries.move_to_end(path)
+                return entry[1]
+        state = castle_save.recover(path)
+        result = analyze(state) if state is not None else None
+        with self.lock:
+            self.entries[path] = (key, result)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return result
+
+
+def eta_text(eta):
+    # 格式化研究中心建成时间
+    if eta is None:
+        return "无法建成"
+    if eta == 0:
+        return "已完成"
+    return f"{eta // 3600}时{eta % 3600 // 60:02d}分{eta % 60:02d}秒"
+
+
+class Dashboard:
+    # 对比面板窗口
+    # 属性:
+    #   paths: 要显示的路径(存档目录或其上级目录)
+    #   results: 存档目录到最新的分析结果
+    #   tree: 表格
+    #   shown: 表格每行当前显示的值，没有变化的行不再更新
+
+    def __init__(self, root, paths, refresh=REFRESH_SECONDS):
+        # 参数:
+        #   root: 主窗口
+        #   paths: 存档目录列表
+        #   refresh: 自动刷新间隔(秒)
+        self.root = root
+        self.paths = list(paths)
+        self.refresh_ms = int(refresh * 1000)
+        self.results = {}
+        self.shown = {}
+        self.cache = SaveCache()
+        self.pool = concurrent.futures.ThreadPoolExecutor(READ_THREADS)
+        self.generation = 0
+        self.refresh_id = None
+
+        control_frame = tk.Frame(root)
+        control_frame.pack(fill="x", padx=10, pady=5)
+        tk.Button(control_frame, text="添加存档", font=("隶书", 15), command=self.add_save).pack(side="left")
+        tk.Button(control_frame, text="刷新", font=("隶书", 15), command=self.refresh).pack(side="left", padx=5)
+        self.status_label = tk.Label(control_frame, text="", font=("隶书", 15))
+        self.status_label.pack(side="left", padx=10)
+
+        columns = ["rank", "save", "time"] + list(castle_core.RESOURCE_NAMES) + ["eta"]
+        self.tree = ttk.Treeview(root, columns=columns, show="headings")
+        headings = {"rank": "排名", "save": "存档", "time": "游戏时间", "eta": "研究中心"}
+        headings.update(castle_core.RESOURCE_NAMES)
+        for column in columns:
+            self.tree.heading(column, text=headings[column])
+            self.tree.column(column, width=60 if column == "rank" else 150)
+        self.tree.pack(expand=True, fill="both", padx=10, pady=5)
+
+        self.refresh()
+
+    def add_save(self):
+        # 选择一个存档目录加入面板
+        path = filedialog.askdirectory(title="选择存档目录")
+        if path:
+            self.paths.append(path)
+            self.refresh()
+
+    def refresh(self):
+        # 重新读取所有存档，结果通过after_idle交回Tk线程
+        if self.refresh_id is not None:
+            self.root.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        self.generation += 1
+        self.status_label.config(text="正在刷新...")
+        threading.Thread(target=self.load_all, args=(self.generation,), daemon=True).start()
+
+    def load_all(self, generation):
+        # 在后台线程中展开目录，并在线程池中并行加载所有存档
+        # 无论是否出错都把结果交回Tk线程，否则状态会一直停在"正在刷新..."，自动刷新也不再继续
+        results, error = {}, None
+        try:
+            saves = find_saves(self.paths)
+            results = dict(zip(saves, self.pool.map(self.load_one, saves)))
+        except Exception as exc:
+            error = exc
+        self.root.after_idle(self.show, generation, results, error)
+
+    def load_one(self, path):
+        # 加载一个存档，读取失败时记为None；段文件恰好在压缩时被替换的，重试一次
+        for _ in range(2):
+            try:
+                return self.cache.load(path)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, SyntaxError, zlib.error):
+                return None
+        return None
+
+    def show(self, generation, results, error=None):
+        # 显示一次刷新的结果(在Tk线程中调用)，过期的刷新结果直接丢弃
+        # 参数:
+        #   generation: 刷新编号
+        #   results: 存档目录到分析结果
+        #   error: 展开目录或加载时发生的异常(可选)，此时保留上一次的表格，只显示错误
+        if generation != self.generation:
+            return
+        if error is not None:
+            self.status_label.config(text=f"刷新失败: {error}")
+            self.refresh_id = self.root.after(self.refresh_ms, self.refresh)
+            return
+        self.results = results
+        # 按研究中心建成时间排名，无法建成和无法读取的排在最后
+        etas = {path: result["eta"] if result is not None else None for path, result in results.items()}
+        ranked = sorted(results, key=lambda path: (etas[path] is None, etas[path] or 0, path))
+        for iid in set(self.shown) - set(results):
+            self.tree.delete(iid)
+            del self.shown[iid]
+        for rank, path in enumerate(ranked, 1):
+            result = results[path]
+            name = os.path.basename(os.path.normpath(path))
+            if result is None:
+                values = (rank, name, "无法读取") + ("",) * (len(castle_core.RESOURCE_NAMES) + 1)
+            else:
+                values = ((rank, name, f"{result['time']}秒")
+                          + tuple(f"{result['resources'][key]} (+{result['rates'][key]}/秒)"
+                                  for key in castle_core.RESOURCE_NAMES)
+                          + (eta_text(result["eta"]),))
+            if path not in self.shown:
+                self.tree.insert("", "end", iid=path, values=values)
+            elif self.shown[path] != values:
+                self.tree.item(path, values=values)
+            self.shown[path] = values
+            self.tree.move(path, "", rank - 1)
+        self.status_label.config(text=f"共{len(results)}个存档")
+        self.refresh_id = self.root.after(self.refresh_ms, self.refresh)
+
+
+def main():
+    # 解析命令行参数并打开对比面板
+    paths = []
+    refresh = REFRESH_SECONDS
+    for arg in sys.argv[1:]:
+        if arg.startswith("--refresh="):
+            refresh = float(arg.split("=", 1)[1])
+        elif arg.startswith("--rules="):
+            castle_core.load_rules(arg.split("=", 1)[1])
+        else:
+            paths.append(arg)
+    root = tk.Tk()
+    root.title("模拟城堡存档对比")
+    root.geometry("1200x600")
+    Dashboard(root, paths, refresh)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# 模拟城堡界面回归工具 - 在虚拟显示(Xvfb)中运行真实的start_new_game()界面，
+# 按脚本点击雇佣、建造、行业建筑等按钮，每一步之后记录所有标签、按钮和画布文字，与标准结果比较。
+#
+# 游戏时间由虚拟时钟驱动(替换simulated_castle中的time)，快进多少秒就推进多少秒，与真实时间无关，
+# 每次运行的结果完全相同；弹窗被记录下来而不是显示。每个场景在独立的Python进程中运行，
+# 多个场景分配到多个Xvfb实例上并行执行。
+#
+# 场景文件(golden/scenarios/名称.json):
+#   {"args": ["--canvas"],                      启动参数(可选)
+#    "steps": [{"click": ["worker", "farmer"]},  左键点击面板元素对应的按钮或标签
+#              {"right_click": ["building", "farm"]},  右键点击(优先建造)
+#              {"button": "撤销"},               点击文字为该值的按钮
+#              {"advance": 30}]}                 快进若干秒
+# 标准结果保存在golden/expected/名称.json。
+#
+# 用法: python castle_golden.py [--record] [--jobs=N] [--dir=golden] [场景名称...]
+#   --record  重新录制标准结果，而不是比较
+import concurrent.futures
+import json
+import os
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+GOLDEN_DIR = "golden"
+
+# 单个场景的最长运行时间(秒)
+SCENARIO_TIMEOUT = 60
+
+
+class VirtualClock:
+    # 代替time模块的虚拟时钟，只在场景快进时前进
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class DialogRecorder:
+    # 代替messagebox，把弹窗记录到当前步骤中
+    def __init__(self):
+        self.dialogs = []
+
+    def showinfo(self, title, message):
+        self.dialogs.append(["info", title, message])
+
+    def showwarning(self, title, message):
+        self.dialogs.append(["warning", title, message])
+
+
+def widget_texts(widget, texts):
+    # 递归记录控件树中所有文字
+    # 参数:
+    #   widget: 起始控件
+    #   texts: {控件路径: [文字, 颜色]}，结果写入其中
+    for child in widget.winfo_children():
+        path = str(child)
+        kind = child.winfo_class()
+        if kind == "Canvas":
+            for item in child.find_all():
+                if child.type(item) == "text":
+                    texts[f"{path}#{item}"] = [child.itemcget(item, "text"), child.itemcget(item, "fill")]
+        elif kind in ("Label", "Button", "Labelframe"):
+            texts[path] = [child.cget("text"), str(child.cget("fg"))]
+        elif kind == "TCombobox":
+            texts[path] = [child.get(), ""]
+        widget_texts(child, texts)
+
+
+def find_button(widget, text):
+    # 按文字查找按钮
+    for child in widget.winfo_children():
+        if child.winfo_class() == "Button" and child.cget("text") == text:
+            return child
+        found = find_button(child, text)
+        if found is not None:
+            return found
+    return None
+
+
+def click(game, key, right=False):
+    # 点击面板元素对应的按钮或标签
+    # 参数:
+    #   game: simulated_castle模块
+    #   key: (面板, 键)
+    #   right: 是否为右键
+    sequence = "<Button-3>" if right else "<Button-1>"
+    if game.canvas_renderer is not None:
+        # 画布面板也只显示部分条目，先滚动到目标条目
+        game.canvas_renderer.scroll_to(key)
+        canvas = game.canvas_renderer.canvas
+        region = next(region for region in game.canvas_renderer.regions if region[4] == key)
+        canvas.event_generate(sequence, x=(region[0] + region[2]) // 2, y=(region[1] + region[3]) // 2)
+        return
+    kind = key[0]
+    if kind in ("worker", "building"):
+        # 虚拟列表只显示部分行，先滚动到目标行
+        items = game.worker_list if kind == "worker" else game.building_list
+        items.yview("moveto", items.keys.index(key) / len(items.keys))
+        button = items.buttons()[key]
+        if right:
+            button.event_generate(sequence)
+        else:
+            button.invoke()
+        return
+    if kind == "society":
+        strip = game.society_strip
+        strip.xview("moveto", strip.keys.index(key) / len(strip.keys))
+        strip.visible()[key].event_generate(sequence)
+        return
+    game.panel_widgets[key].event_generate(sequence)
+
+
+def run_scenario(scenario):
+    # 在当前进程中运行一个场景(需要可用的显示)
+    # 参数:
+    #   scenario: 场景字典
+    # 返回:
+    #   每一步的记录 [{"step": 步骤, "texts": {...}, "dialogs": [...]}]
+    save_dir = tempfile.mkdtemp(prefix="castle_golden_")
+    sys.argv = ["simulated_castle.py", f"--save={save_dir}"] + scenario.get("args", [])
+    import simulated_castle as game
+
+    clock = VirtualClock()
+    recorder = DialogRecorder()
+    game.time = clock
+    game.messagebox = recorder
+    # main()只创建窗口，不进入事件循环；定时回调由快进步骤直接调用
+    game.tk.Tk.mainloop = lambda self, n=0: None
+    game.main()
+    try:
+        find_button(game.root, "开始新游戏").invoke()
+        game.root.update_idletasks()
+        result = []
+        for step in [{"start": True}] + scenario["steps"]:
+            recorder.dialogs = []
+            if "click" in step:
+                click(game, tuple(step["click"]))
+            elif "right_click" in step:
+                click(game, tuple(step["right_click"]), right=True)
+            elif "button" in step:
+                find_button(game.root, step["button"]).invoke()
+            elif "advance" in step:
+                clock.now += step["advance"]
+                game.update_resources()
+            game.root.update_idletasks()
+            texts = {}
+            widget_texts(game.root, texts)
+            result.append({"step": step, "texts": texts, "dialogs": recorder.dialogs})
+        return result
+    finally:
+        game.root.destroy()
+        shutil.rmtree(save_dir, ignore_errors=True)
+
+
+def start_xvfb():
+    # 启动一个Xvfb实例并等待其可用
+    # 显示编号由Xvfb自己选择一个空闲的(-displayfd)，准备好接受连接后才写出编号，
+    # 不会与同时运行的其他实例或已有的X服务器冲突
+    # 返回:
+    #   (Xvfb进程, 显示名称如":1")
+    read_fd, write_fd = os.pipe()
+    try:
+        process = subprocess.Popen(["Xvfb", "-displayfd", str(write_fd), "-screen", "0", "1280x1024x24",
+                                    "-nolisten", "tcp"],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, pass_fds=(write_fd,))
+    finally:
+        os.close(write_fd)
+    try:
+        output = b""
+        deadline = time.monotonic() + 10
+        while not output.endswith(b"\n"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                process.kill()
+                raise RuntimeError("Xvfb启动超时")
+            chunk = os.read(read_fd, 64)
+            if not chunk:
+                raise RuntimeError("无法启动Xvfb")
+            output += chunk
+    finally:
+        os.close(read_fd)
+    return process, f":{int(output)}"
+
+
+def compare(expected, actual):
+    # 比较标准结果和本次结果
+    # 返回:
+    #   差异描述列表，完全相同时为空
+    problems = []
+    if len(expected) != len(actual):
+        problems.append(f"步骤数不同: 标准{len(expected)}步，本次{len(actual)}步")
+    for index, (old, new) in enumerate(zip(expected, actual)):
+        for key in sorted(set(old["texts"]) | set(new["texts"])):
+            if old["texts"].get(key) != new["texts"].get(key):
+                problems.append(f"第{index}步 {new['step']} {key}: {old['texts'].get(key)} -> {new['texts'].get(key)}")
+        if old["dialogs"] != new["dialogs"]:
+            problems.append(f"第{index}步 {new['step']} 弹窗: {old['dialogs']} -> {new['dialogs']}")
+    return problems
+
+
+def run_in_display(path, display):
+    # 在指定显示上用独立进程运行一个场景
+    # 返回:
+    #   (每一步的记录, 错误输出)；运行失败时记录为None
+    env = dict(os.environ, DISPLAY=display)
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), f"--run={path}"],
+                             capture_output=True, env=env, timeout=SCENARIO_TIMEOUT,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    if process.returncode != 0:
+        return None, process.stderr.decode("utf-8", "replace")
+    return json.loads(process.stdout), ""
+
+
+def run_all(names, golden_dir=GOLDEN_DIR, jobs=None, record=False):
+    # 并行运行场景，比较或录制标准结果
+    # 参数:
+    #   names: 场景名称列表(空表示全部)
+    #   golden_dir: 场景和标准结果目录
+    #   jobs: 并行数(默认为CPU数)
+    #   record: 是否录制标准结果
+    # 返回:
+    #   失败的场景数
+    scenario_dir = os.path.join(golden_dir, "scenarios")
+    expected_dir = os.path.join(golden_dir, "expected")
+    if not names:
+        names = sorted(filename[:-len(".json")] for filename in os.listdir(scenario_dir)
+                       if filename.endswith(".json"))
+    # 并行数不超过场景数，每个并行任务都要启动一个Xvfb
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(names)))
+
+    if not shutil.which("Xvfb") and not os.environ.get("DISPLAY"):
+        print("没有找到Xvfb，也没有设置DISPLAY")
+        return len(names)
+
+    failures = 0
+    servers = []
+    try:
+        # 每个并行任务使用自己的Xvfb；没有Xvfb时共用当前显示
+        if shutil.which("Xvfb"):
+            for _ in range(jobs):
+                servers.append(start_xvfb())
+            displays = [display for _, display in servers]
+        else:
+            displays = [os.environ["DISPLAY"]] * jobs
+        with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+            futures = {pool.submit(run_in_display, os.path.abspath(os.path.join(scenario_dir, f"{name}.json")),
+                                   displays[i % jobs]): name for i, name in enumerate(names)}
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                actual, error = future.result()
+                expected_path = os.path.join(expected_dir, f"{name}.json")
+                if actual is None:
+                    failures += 1
+                    print(f"错误 {name}\n{error}")
+                elif record:
+                    os.makedirs(expected_dir, exist_ok=True)
+                    with open(expected_path, "w", encoding="utf-8") as f:
+                        json.dump(actual, f, ensure_ascii=False, indent=1)
+                    print(f"已录制 {name}")
+                elif not os.path.exists(expected_path):
+                    failures += 1
+                    print(f"缺少标准结果 {name}(使用 --record 录制)")
+                else:
+                    with open(expected_path, encoding="utf-8") as f:
+                        problems = compare(json.load(f), actual)
+                    if problems:
+                        failures += 1
+                        print(f"不一致 {name}")
+                        for problem in problems:
+                            print(f"  {problem}")
+                    else:
+                        print(f"通过 {name}")
+    finally:
+        for server, _ in servers:
+            server.terminate()
+    return failures
+
+
+def main():
+    # 解析命令行参数并运行
+    options = {}
+    names = []
+    for arg in sys.argv[1:]:
+        if arg.startswith("--"):
+            name, _, value = arg[2:].partition("=")
+            options[name] = value
+        else:
+            names.append(arg)
+    if "run" in options:
+        # 子进程: 运行一个场景并把结果输出到标准输出
+        with open(options["run"], encoding="utf-8") as f:
+            scenario = json.load(f)
+        # 游戏代码的其他输出改到标准错误，标准输出只留给结果
+        output = sys.stdout
+        sys.stdout = sys.stderr
+        result = run_scenario(scenario)
+        output.write(json.dumps(result, ensure_ascii=False))
+        return
+    jobs = int(options["jobs"]) if "jobs" in options else None
+    failures = run_all(names, options.get("dir", GOLDEN_DIR), jobs, "record" in options)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# 模拟城堡指标导出 - 以Prometheus文本格式导出每个殖民地的资源、工人、建筑、研究进度、
+# 推进延迟、动作数和失败原因，写入本地文件或通过HTTP端点提供。
+#
+# 更新不加锁: 计数器只由推进线程(Tk线程或asyncio循环)写入，导出线程只读取；
+# 状态每隔interval秒由推进线程做一次快照(结构共享，代价很小)，通过替换引用交给导出线程。
+# 文本格式化、写文件和HTTP响应都在导出线程中完成，推进线程每次只做几次整数加法。
+import http.server
+import os
+import threading
+import time
+
+import castle_core
+
+# 导出间隔(秒)
+INTERVAL = 5
+
+
+class ColonyMetrics:
+    # 一个殖民地的指标，只由推进线程写入
+    # 属性:
+    #   ticks: 推进次数
+    #   actions: 玩家动作次数
+    #   failures: 失败原因(提示标题)到次数
+    #   lag: 最近一次推进落后于真实时间的秒数
+    #   snapshot: 最近一次发布的状态快照
+
+    def __init__(self):
+        self.ticks = 0
+        self.actions = 0
+        self.failures = {}
+        self.lag = 0.0
+        self.snapshot = None
+
+    def action(self, error=None):
+        # 记录一次玩家动作
+        # 参数:
+        #   error: 动作失败时的(标题, 提示)
+        self.actions += 1
+        if error:
+            self.failure(error)
+
+    def failure(self, error):
+        # 记录一次失败的动作(动作本身已经计数时使用，如独立模拟进程的回复)
+        self.failures[error[0]] = self.failures.get(error[0], 0) + 1
+
+    def publish(self, state):
+        # 发布状态快照，供导出线程读取
+        self.snapshot = castle_core.snapshot(state, self.snapshot)
+
+
+def escape(value):
+    # 转义标签值
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Metrics:
+    # 指标导出器
+    # 属性:
+    #   colonies: 殖民地编号到ColonyMetrics
+    #   path: 导出文件路径(可选)
+    #   port: HTTP端口(可选)
+    #   interval: 导出和快照间隔(秒)
+
+    def __init__(self, path=None, port=None, interval=INTERVAL):
+        # 参数:
+        #   path: 导出文件路径，每interval秒原子地重写一次
+        #   port: HTTP端口，访问/metrics时返回最新指标
+        #   interval: 导出和快照间隔(秒，默认5)
+        self.colonies = {}
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self.next_publish = 0
+        self.stopped = threading.Event()
+        self.http = None
+
+    def colony(self, colony_id):
+        # 取得(必要时创建)某个殖民地的指标
+        metrics = self.colonies.get(colony_id)
+        if metrics is None:
+            metrics = self.colonies[colony_id] = ColonyMetrics()
+        return metrics
+
+    def remove(self, colony_id):
+        # 删除某个殖民地的指标
+        self.colonies.pop(colony_id, None)
+
+    def due(self):
+        # 推进线程调用: 是否到了发布快照的时间
+        now = time.monotonic()
+        if now < self.next_publish:
+            return False
+        self.next_publish = now + self.interval
+        return True
+
+    def exposition(self):
+        # 生成Prometheus文本格式的指标(在导出线程和HTTP处理线程中调用，只读取，不修改任何状态)
+        # 每秒动作数不在这里计算，由使用方对castle_actions_total求rate()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            # 输出一个指标的说明和所有样本
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                text = ",".join(f'{key}="{escape(label)}"' for key, label in labels.items())
+                lines.append(f"{name}{{{text}}} {value}")
+
+        colonies = [(colony_id, metrics, metrics.snapshot) for colony_id, metrics in list(self.colonies.items())]
+        states = [(colony_id, snap) for colony_id, _, snap in colonies if snap is not None]
+
+        metric("castle_resource", "gauge", "Resource amount",
+               [({"colony": colony_id, "resource": key}, amount)
+                for colony_id, snap in states for key, amount in snap["resources"].items()])
+        metric("castle_workers", "gauge", "Hired workers",
+               [({"colony": colony_id, "worker": key}, count)
+                for colony_id, snap in states for key, count in snap["workers"].items()])
+        metric("castle_worker_capacity", "gauge", "Housing capacity per worker type",
+               [({"colony": colony_id, "worker": key}, castle_core.capacity(snap, key))
+                for colony_id, snap in states for key in snap["workers"]])
+        metric("castle_buildings", "gauge", "Houses built",
+               [({"colony": colony_id, "building": key}, count)
+                for colony_id, snap in states for key, count in snap["buildings"].items()])
+        metric("castle_society_built", "gauge", "Whether an industry building is built",
+               [({"colony": colony_id, "society": key}, int(built))
+                for colony_id, snap in states for key, built in snap["industry"].items()])
+        metric("castle_research_progress", "gauge", "Research center build points",
+               [({"colony": colony_id}, snap["research"]["progress"]) for colony_id, snap in states])
+        metric("castle_research_required", "gauge", "Research center build points required",
+               [({"colony": colony_id}, snap["research"]["required"]) for colony_id, snap in states])
+        metric("castle_research_built", "gauge", "Whether the research center is built",
+               [({"colony": colony_id}, int(snap["research"]["built"])) for colony_id, snap in states])
+        metric("castle_game_seconds", "gauge", "Game time",
+               [({"colony": colony_id}, snap["time"]) for colony_id, snap in states])
+        metric("castle_tick_lag_seconds", "gauge", "How far the last tick ran behind wall-clock time",
+               [({"colony": colony_id}, f"{metrics.lag:.6f}") for colony_id, metrics, _ in colonies])
+        metric("castle_ticks_total", "counter", "Ticks simulated",
+               [({"colony": colony_id}, metrics.ticks) for colony_id, metrics, _ in colonies])
+        metric("castle_actions_total", "counter", "Player actions",
+               [({"colony": colony_id}, metrics.actions) for colony_id, metrics, _ in colonies])
+
+        metric("castle_failed_actions_total", "counter", "Failed player actions by reason",
+               [({"colony": colony_id, "reason": reason}, count)
+                for colony_id, metrics, _ in colonies for reason, count in list(metrics.failures.items())])
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        # 把指标原子地写入导出文件
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.exposition())
+        os.replace(self.path + ".tmp", self.path)
+
+    def start(self):
+        # 启动导出线程和HTTP端点(按配置)
+        if self.path is not None:
+            threading.Thread(target=self.run, daemon=True).start()
+        if self.port is not None:
+            exporter = self
+
+            class Handler(http.server.BaseHTTPRequestHandler):
+                # 只提供/metrics
+                def do_GET(self):
+                    if self.path != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = exporter.exposition().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self.http = http.server.ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def run(self):
+        # 导出线程: 每interval秒写一次导出文件
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        # 停止导出，导出文件最后再写一次
+        self.stopped.set()
+        if self.http is not None:
+            self.http.shutdown()
+        if self.path is not None:
+            self.write()
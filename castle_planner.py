@@ -0,0 +1,145 @@
+# 模拟城堡后台规划器 - 回答"如果一直雇佣某种工人，多久才能负担得起某个建筑"
+# 规划在工作线程中对状态快照做无界面快进模拟，不会阻塞界面的每秒更新和输入。
+import threading
+
+import castle_core
+from castle_core import BUILDING_RULES, SOCIETY_RULES, RESEARCH_RULES, WORKER_RULES
+
+def goals():
+    # 规划目标 - 名称与所需资源(按当前规则表生成，扩展规则中的建筑也会出现)
+    result = {"研究中心": RESEARCH_RULES["cost"]}
+    for society, rule in SOCIETY_RULES.items():
+        result[society] = rule["cost"]
+    for building, rule in BUILDING_RULES.items():
+        result[rule["short"]] = rule["cost"]
+    return result
+
+
+# 候选策略 - 名称与持续雇佣的工人，按顺序优先雇佣，住满时自动扩建
+# 条目为工人类型时一直雇佣；为(工人类型, 人数)时只雇佣到该人数，之后的资源留给后面的条目，
+# 这样才能攒下建筑社、工人房和建筑工这类大额花费
+STRATEGIES = {
+    "什么都不做": [],
+    "优先雇佣农民": ["farmer", "lumber", "quarry", "mine"],
+    "优先雇佣伐木工": ["lumber", "farmer", "quarry", "mine"],
+    "优先雇佣采石工": ["quarry", "farmer", "lumber", "mine"],
+    "优先雇佣铁矿工": ["mine", "farmer", "lumber", "quarry"],
+    "均衡生产后雇佣5名建筑工": [("farmer", 40), ("lumber", 80), ("quarry", 40), ("mine", 40), ("builder", 5)],
+    "均衡生产后雇佣10名建筑工": [("farmer", 40), ("lumber", 80), ("quarry", 40), ("mine", 40), ("builder", 10)],
+    "均衡生产后雇佣15名建筑工": [("farmer", 40), ("lumber", 80), ("quarry", 40), ("mine", 40), ("builder", 15)]
+}
+
+# 最长模拟时间(秒)
+HORIZON = 4 * 3600
+
+
+def expand_housing(state, worker, limit=None):
+    # 工人住满时，先建造对应的行业建筑，再用能负担的资源批量建造居住建筑
+    # 已经有同类建筑在建造队列中时不再追加
+    # 参数:
+    #   state: 模拟中的状态
+    #   worker: 工人类型
+    #   limit: 目标人数(可选)，给出时只建造容纳该人数所需的居住建筑
+    # 返回:
+    #   是否下单建造了任何建筑
+    house = WORKER_RULES[worker]["house"]
+    rule = BUILDING_RULES[house]
+    society = rule["society"]
+    if not state["industry"][society]:
+        return castle_core.build_society(state, society) is None
+    if state["pending"].get(house):
+        return False
+    count = castle_core.affordable_count(state["resources"], rule["cost"])
+    if limit is not None:
+        count = min(count, -(-(limit - castle_core.capacity(state, worker)) // rule["capacity"]))
+    return count > 0 and castle_core.build_house(state, house, count) is None
+
+
+def run_strategy(state, strategy):
+    # 按策略执行这一秒内能做的所有雇佣(批量计算，避免逐个雇佣)
+    # 参数:
+    #   state: 模拟中的状态
+    #   strategy: 策略条目列表(见STRATEGIES)
+    progress = True
+    while progress:
+        progress = False
+        for entry in strategy:
+            worker, limit = entry if isinstance(entry, tuple) else (entry, None)
+            if limit is not None and state["workers"][worker] >= limit:
+                continue
+            room = castle_core.capacity(state, worker) - state["workers"][worker]
+            if room <= 0:
+                progress = expand_housing(state, worker, limit) or progress
+                continue
+            if limit is not None:
+                room = min(room, limit - state["workers"][worker])
+            count = min(room, castle_core.affordable_count(state["resources"],
+                                                           WORKER_RULES[worker]["cost"]))
+            if count > 0:
+                castle_core.hire(state, worker, count)
+                progress = True
+
+
+def simulate_plan(snap, goal, strategy, horizon=HORIZON, cancel=None):
+    # 从快照出发按策略快进，直到目标资源足够
+    # 参数:
+    #   snap: 状态快照
+    #   goal: 目标名称(goals()中的键)
+    #   strategy: 策略名称(STRATEGIES中的键)
+    #   horizon: 最长模拟秒数
+    #   cancel: 取消事件(可选)，被设置时提前返回None
+    # 返回:
+    #   目标负担得起所需的秒数；超出模拟时间时返回-1；被取消时返回None
+    cost = goals()[goal]
+    workers = STRATEGIES[strategy]
+    state = castle_core.fork(snap)
+    for second in range(horizon + 1):
+        if castle_core.check_cost(state["resources"], cost) is None:
+            return second
+        if cancel is not None and second % 256 == 0 and cancel.is_set():
+            return None
+        run_strategy(state, workers)
+        if castle_core.check_cost(state["resources"], cost) is None:
+            return second
+        castle_core.advance(state, 1)
+    return -1
+
+
+class Planner:
+    # 后台规划器，同一时间只运行一个规划请求
+    # 属性:
+    #   deliver: 结果回调 deliver(request_id, strategy, eta)，在工作线程中调用
+    #   request_id: 当前请求编号，旧请求的结果据此丢弃
+    #   cancel: 当前请求的取消事件
+
+    def __init__(self, deliver):
+        # 参数:
+        #   deliver: 结果回调(界面中通过after_idle转回Tk线程)
+        self.deliver = deliver
+        self.request_id = 0
+        self.cancel = None
+
+    def request(self, snap, goal):
+        # 发起新的规划请求，并取消仍在运行的旧请求
+        # 参数:
+        #   snap: 状态快照
+        #   goal: 目标名称
+        # 返回:
+        #   新请求的编号
+        if self.cancel is not None:
+            self.cancel.set()
+        self.request_id += 1
+        self.cancel = threading.Event()
+        worker = threading.Thread(target=self.run,
+                                  args=(self.request_id, snap, goal, self.cancel),
+                                  daemon=True)
+        worker.start()
+        return self.request_id
+
+    def run(self, request_id, snap, goal, cancel):
+        # 在工作线程中依次模拟每个候选策略，每完成一个就回传结果
+        for strategy in STRATEGIES:
+            eta = simulate_plan(snap, goal, strategy, cancel=cancel)
+            if eta is None:
+                return
+            self.deliver(request_id, strategy, eta)
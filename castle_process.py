@@ -0,0 +1,175 @@
+# 模拟城堡独立模拟进程 - 游戏模拟在单独的进程中运行
+# 模拟进程每秒推进游戏，并把状态通过共享内存发布给界面进程；玩家命令通过队列发回模拟进程。
+# 这样界面重绘再慢也不会拖慢游戏时间，模拟进程里的计算或垃圾回收也不会造成界面输入卡顿。
+#
+# 共享内存布局(顺序锁):
+#   [0:8]   序号，写入期间为奇数，写完后为偶数
+#   [8:12]  状态数据长度
+#   [12:20] 最近一次推进落后于预定时间的秒数(双精度浮点数，供指标使用)
+#   [20:]   pickle后的状态字典
+import multiprocessing
+import pickle
+import queue
+import struct
+import time
+from multiprocessing import shared_memory
+
+import castle_core
+
+# 共享内存大小(字节)
+BUFFER_SIZE = 1 << 20
+
+HEADER = struct.Struct("<QId")
+
+
+def publish(buf, seq, state, lag=0.0):
+    # 把状态写入共享内存
+    # 参数:
+    #   buf: 共享内存缓冲区
+    #   seq: 上一次发布后的序号(偶数)
+    #   state: 游戏状态
+    #   lag: 最近一次推进落后于预定时间的秒数
+    # 返回:
+    #   新的序号
+    data = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+    if HEADER.size + len(data) > len(buf):
+        raise ValueError("游戏状态超出共享内存大小")
+    HEADER.pack_into(buf, 0, seq + 1, len(data), lag)
+    buf[HEADER.size:HEADER.size + len(data)] = data
+    HEADER.pack_into(buf, 0, seq + 2, len(data), lag)
+    return seq + 2
+
+
+def read(buf, last_seq=None):
+    # 从共享内存读取状态；正在写入或读取期间被改写时放弃本次读取，不会阻塞界面
+    # 参数:
+    #   buf: 共享内存缓冲区
+    #   last_seq: 上一次读到的序号(可选)，没有变化时直接返回
+    # 返回:
+    #   (序号, 状态, 推进延迟)；没有读到新状态时返回(last_seq, None, None)
+    seq, length, lag = HEADER.unpack_from(buf, 0)
+    if seq == last_seq or seq % 2:
+        return last_seq, None, None
+    data = bytes(buf[HEADER.size:HEADER.size + length])
+    if HEADER.unpack_from(buf, 0)[0] != seq:
+        return last_seq, None, None
+    return seq, pickle.loads(data), lag
+
+
+def run_simulation(shm_name, commands, replies, tick_rate=1, rules_path=None):
+    # 模拟进程主循环: 处理命令、按时推进游戏并发布状态
+    # 参数:
+    #   shm_name: 共享内存名称
+    #   commands: 命令队列，元素为(命令名, 参数...)，收到"stop"时退出，
+    #             收到("restore", 快照)时用快照替换当前状态(加载存档)
+    #   replies: 回复队列，元素为("error", (标题, 提示))、("event", 事件名)，
+    #            或模拟出错退出前的("crash", 错误说明)
+    #   tick_rate: 每秒推进的次数
+    #   rules_path: 扩展规则文件(可选)
+    if rules_path is not None:
+        castle_core.load_rules(rules_path)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    interval = 1 / tick_rate
+    state = castle_core.new_game(tick_rate)
+    history = castle_core.History(limit=100)
+    next_tick = time.monotonic() + interval
+    lag = 0.0
+    try:
+        seq = publish(shm.buf, 0, state)
+        while True:
+            try:
+                command = commands.get(timeout=max(0, next_tick - time.monotonic()))
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                if command[0] == "stop":
+                    break
+                if command[0] == "restore":
+                    castle_core.restore(state, command[1])
+                else:
+                    error = castle_core.perform(state, history, *command)
+                    if error:
+                        replies.put(("error", error))
+                seq = publish(shm.buf, seq, state, lag)
+
+            now = time.monotonic()
+            if now >= next_tick:
+                # 落后时一次补齐所有到期的推进
+                due = int((now - next_tick) / interval) + 1
+                lag = now - next_tick
+                for event in castle_core.tick(state, due):
+                    replies.put(("event", event))
+                next_tick += due * interval
+                seq = publish(shm.buf, seq, state, lag)
+    except Exception as error:
+        # 把原因告诉界面进程，否则界面只会一直显示共享内存中最后的状态
+        replies.put(("crash", f"{type(error).__name__}: {error}"))
+        raise
+    finally:
+        shm.close()
+
+
+class SimulationProcess:
+    # 界面进程持有的模拟进程句柄
+    # 属性:
+    #   shm: 共享内存
+    #   commands: 命令队列
+    #   replies: 回复队列
+    #   process: 模拟进程
+    #   seq: 界面上一次读到的序号
+    #   lag: 界面上一次读到的推进延迟(秒)
+
+    def __init__(self, tick_rate=1, rules_path=None):
+        # 参数:
+        #   tick_rate: 每秒推进的次数(默认1)
+        #   rules_path: 扩展规则文件(可选)，模拟进程中也会加载
+        self.shm = shared_memory.SharedMemory(create=True, size=BUFFER_SIZE)
+        HEADER.pack_into(self.shm.buf, 0, 1, 0, 0.0)
+        self.commands = multiprocessing.Queue()
+        self.replies = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=run_simulation,
+                                               args=(self.shm.name, self.commands, self.replies, tick_rate, rules_path),
+                                               daemon=True)
+        self.seq = None
+        self.lag = 0.0
+
+    def start(self):
+        # 启动模拟进程
+        self.process.start()
+
+    def send(self, command, *args):
+        # 发送一条玩家命令
+        self.commands.put((command,) + args)
+
+    def read_state(self):
+        # 读取最新状态(同时更新lag)，状态没有变化时返回None
+        self.seq, state, lag = read(self.shm.buf, self.seq)
+        if state is not None:
+            self.lag = lag
+        return state
+
+    def alive(self):
+        # 模拟进程是否仍在运行
+        return self.process.is_alive()
+
+    def poll_replies(self):
+        # 取出所有待处理的回复
+        replies = []
+        while True:
+            try:
+                replies.append(self.replies.get_nowait())
+            except queue.Empty:
+                return replies
+
+    def stop(self):
+        # 停止模拟进程并释放共享内存；进程还没有启动(在主菜单直接退出)时只释放共享内存
+        try:
+            if self.process.pid is not None:
+                self.commands.put(("stop",))
+                self.process.join(timeout=2)
+                if self.process.is_alive():
+                    self.process.terminate()
+        finally:
+            self.shm.close()
+            self.shm.unlink()
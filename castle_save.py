@@ -0,0 +1,359 @@
+# 模拟城堡存档日志 - 完整检查点加增量记录的存档格式
+# 存档是一个目录，由若干段组成，每段以一个完整检查点开头，后面追加每次变化的增量记录。
+# 增量只记录变化的字段: 数值字段用"字段编号 + 差值"的变长整数编码，其余变化(队列、新增或删除的键)
+# 以Python字面量记录。正常游戏中每秒只有几个资源计数变化，每条增量只有十几个字节。
+# 推进产生的变化每秒(游戏时间)最多记录一次，与每秒推进多少次无关，未压缩的段约每秒13字节；
+# 玩家动作在动作之后立即记录。
+#
+# 记录格式: [类型 1字节][长度 变长整数][内容][CRC32 4字节]
+# 段文件:   000001.log 正在写入或未压缩的段，000001.pack 压缩后的段(zlib)
+# 写完的段在后台线程中压缩；崩溃后恢复时从最后一个有效检查点开始，重放到最后一条有效记录为止，
+# 也可以恢复到任意游戏时间点(见recover)。
+import ast
+import os
+import struct
+import threading
+import time
+import zlib
+
+import castle_core
+
+RECORD_CHECKPOINT = 1
+RECORD_DELTA = 2
+
+# 每隔多少秒游戏时间写一次完整检查点(开始新的一段)
+CHECKPOINT_SECONDS = 3600
+
+# 每隔多少秒(真实时间)把写入的记录同步到磁盘
+FLUSH_SECONDS = 5
+
+# 推进产生的变化最多每隔多少秒(游戏时间)记录一次；玩家动作总是立即记录
+SAVE_SECONDS = 1
+
+CRC = struct.Struct("<I")
+
+
+def write_varint(out, value):
+    # 把非负整数按变长整数编码追加到out(bytearray)
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    # 从data的pos处读取变长整数
+    # 返回:
+    #   (整数, 新位置)；数据不完整时抛出IndexError
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def is_number(value):
+    # 是否是按差值编码的数值字段(布尔值除外)
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def numeric_paths(state):
+    # 列出状态中所有数值字段的路径: (分区,) 或 (分区, 键)
+    paths = []
+    for key, section in state.items():
+        if isinstance(section, dict):
+            paths.extend((key, name) for name, value in section.items() if is_number(value))
+        elif is_number(section):
+            paths.append((key,))
+    return paths
+
+
+class DeltaCodec:
+    # 增量编解码器，写入方和读取方各持有一个，字段编号表在两边按同样的规则增长
+    # 属性:
+    #   fields: 字段编号到路径
+    #   index: 路径到字段编号
+
+    def __init__(self, state):
+        # 参数:
+        #   state: 检查点状态
+        self.fields = []
+        self.index = {}
+        self.add_fields(state)
+
+    def add_fields(self, state):
+        # 为新出现的数值字段分配编号；按路径排序，与字典的插入顺序无关
+        new = [path for path in numeric_paths(state) if path not in self.index]
+        for path in sorted(new, key=repr):
+            self.index[path] = len(self.fields)
+            self.fields.append(path)
+
+    def encode(self, previous, state):
+        # 编码previous到state的变化
+        # 参数:
+        #   previous: 上一次写入时的快照
+        #   state: 当前状态
+        # 返回:
+        #   增量记录内容，没有变化时返回None
+        delta = castle_core.diff(previous, state)
+        if not delta:
+            return None
+        numbers = []
+        others = {}
+        for key, changes in delta.items():
+            old = previous.get(key)
+            if isinstance(changes, dict) and isinstance(old, dict):
+                for name, value in changes.items():
+                    field = self.index.get((key, name))
+                    if field is not None and is_number(value) and is_number(old.get(name)):
+                        numbers.append((field, value - old[name]))
+                    else:
+                        others.setdefault(key, {})[name] = value
+            elif (key,) in self.index and is_number(changes) and is_number(old):
+                numbers.append((self.index[(key,)], changes - old))
+            else:
+                others[key] = changes
+
+        out = bytearray()
+        write_varint(out, len(numbers))
+        for field, change in numbers:
+            write_varint(out, field)
+            # zigzag编码，使小的负数也只占一个字节
+            write_varint(out, change * 2 if change >= 0 else -change * 2 - 1)
+        if others:
+            out += repr(others).encode("utf-8")
+        self.add_fields(state)
+        return bytes(out)
+
+    def apply(self, state, payload):
+        # 把一条增量记录应用到状态上
+        count, pos = read_varint(payload, 0)
+        for _ in range(count):
+            field, pos = read_varint(payload, pos)
+            change, pos = read_varint(payload, pos)
+            change = change // 2 if change % 2 == 0 else -(change + 1) // 2
+            path = self.fields[field]
+            if len(path) == 1:
+                state[path[0]] += change
+            else:
+                state[path[0]][path[1]] += change
+        if pos < len(payload):
+            castle_core.apply_diff(state, ast.literal_eval(payload[pos:].decode("utf-8")))
+        self.add_fields(state)
+
+
+def frame(kind, payload):
+    # 把记录内容加上类型、长度和校验码
+    out = bytearray([kind])
+    write_varint(out, len(payload))
+    out += payload
+    out += CRC.pack(zlib.crc32(out))
+    return bytes(out)
+
+
+def records(data):
+    # 依次取出data中的有效记录，遇到不完整或校验失败的记录时停止(崩溃时写了一半的记录)
+    # 返回:
+    #   生成(类型, 内容)
+    pos = 0
+    while pos < len(data):
+        try:
+            length, start = read_varint(data, pos + 1)
+        except IndexError:
+            return
+        end = start + length
+        if end + CRC.size > len(data) or CRC.unpack_from(data, end)[0] != zlib.crc32(data[pos:end]):
+            return
+        yield data[pos], data[start:end]
+        pos = end + CRC.size
+
+
+def segment_files(path):
+    # 按顺序列出存档目录中的段文件，同一段同时有压缩和未压缩文件时使用压缩文件
+    # 返回:
+    #   [(段号, 文件路径)]
+    found = {}
+    for filename in os.listdir(path):
+        number, _, extension = filename.partition(".")
+        if not number.isdigit() or extension not in ("log", "pack"):
+            continue
+        if extension == "pack" or int(number) not in found:
+            found[int(number)] = os.path.join(path, filename)
+    return sorted(found.items())
+
+
+def read_segment(filename):
+    # 读取一个段文件的全部记录数据；未压缩段恰好在读取前被压缩时改读压缩文件
+    try:
+        with open(filename, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        if not filename.endswith(".log"):
+            raise
+        return read_segment(filename[:-len(".log")] + ".pack")
+    return zlib.decompress(data) if filename.endswith(".pack") else data
+
+
+def compact(filename):
+    # 压缩一个写完的段: 只保留有效记录，先写临时文件再原子替换，最后删除未压缩文件
+    # 参数:
+    #   filename: .log段文件路径
+    data = read_segment(filename)
+    valid = b"".join(frame(kind, payload) for kind, payload in records(data))
+    target = filename[:-len(".log")] + ".pack"
+    with open(target + ".tmp", "wb") as file:
+        file.write(zlib.compress(valid, 9))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(target + ".tmp", target)
+    os.remove(filename)
+
+
+def replay(filename, until=None):
+    # 从一个段文件的检查点开始重放增量记录
+    # 参数:
+    #   filename: 段文件路径
+    #   until: 游戏时间(秒，可选)，见recover
+    # 返回:
+    #   重放得到的状态；段中没有可用的检查点时返回None
+    state = None
+    previous = None
+    for kind, payload in records(read_segment(filename)):
+        if kind == RECORD_CHECKPOINT:
+            checkpoint = ast.literal_eval(payload.decode("utf-8"))
+            if until is not None and checkpoint["time"] > until:
+                break
+            state = castle_core.fork(checkpoint)
+            codec = DeltaCodec(state)
+        elif kind == RECORD_DELTA and state is not None:
+            if until is not None:
+                previous = castle_core.snapshot(state, previous)
+            codec.apply(state, payload)
+            if until is not None and state["time"] > until:
+                castle_core.restore(state, previous)
+                break
+    return state
+
+
+def recover(path, until=None):
+    # 从存档恢复状态
+    # 参数:
+    #   path: 存档目录
+    #   until: 游戏时间(秒，可选)，给出时恢复到该时间点结束时的状态，否则恢复到最后一条有效记录
+    # 返回:
+    #   恢复的状态；没有可用的存档时返回None
+    if not os.path.isdir(path):
+        return None
+    for _, filename in reversed(segment_files(path)):
+        try:
+            state = replay(filename, until)
+        except (zlib.error, ValueError, SyntaxError):
+            # 段文件损坏(如压缩段被截断或写坏)时改用前一段
+            continue
+        if state is not None:
+            return state
+    return None
+
+
+class Journal:
+    # 存档日志写入器
+    # 属性:
+    #   path: 存档目录
+    #   file: 当前段文件
+    #   codec: 当前段的增量编码器
+    #   previous: 上一次写入时的快照
+    #   checkpoint_time: 当前段检查点的游戏时间
+    #   saved_time: 上一次记录时的游戏时间
+    #   compactors: 正在运行的后台压缩线程
+
+    def __init__(self, path, checkpoint_seconds=CHECKPOINT_SECONDS, flush_seconds=FLUSH_SECONDS,
+                 save_seconds=SAVE_SECONDS):
+        # 参数:
+        #   path: 存档目录，不存在时创建；已有的段会保留，新记录写入新的一段
+        #   checkpoint_seconds: 写完整检查点的间隔(游戏时间秒)
+        #   flush_seconds: 同步到磁盘的间隔(真实时间秒)
+        #   save_seconds: 推进产生的变化的记录间隔(游戏时间秒)
+        self.path = path
+        self.checkpoint_seconds = checkpoint_seconds
+        self.flush_seconds = flush_seconds
+        self.save_seconds = save_seconds
+        self.file = None
+        self.codec = None
+        self.previous = None
+        self.checkpoint_time = 0
+        self.saved_time = None
+        self.last_flush = time.monotonic()
+        self.compactors = []
+        os.makedirs(path, exist_ok=True)
+        segments = segment_files(path)
+        self.next_segment = segments[-1][0] + 1 if segments else 1
+        # 上次异常退出时留下的未压缩段
+        for _, filename in segments:
+            if filename.endswith(".log"):
+                self.start_compaction(filename)
+
+    def save(self, state, force=False):
+        # 记录当前状态；与上一次记录相同时不写任何内容
+        # 每秒推进多次时不必每次都记录: 距上一次记录不到save_seconds秒(游戏时间)时跳过，
+        # 下一次记录的增量会包含这段时间的全部变化
+        # 参数:
+        #   state: 游戏状态
+        #   force: 立即记录(玩家动作之后使用)，不受记录间隔限制
+        if self.file is None or state["time"] - self.checkpoint_time >= self.checkpoint_seconds:
+            self.checkpoint(state)
+        elif not force and state["time"] - self.saved_time < self.save_seconds:
+            return
+        else:
+            payload = self.codec.encode(self.previous, state)
+            if payload is None:
+                return
+            self.file.write(frame(RECORD_DELTA, payload))
+            self.previous = castle_core.snapshot(state, self.previous)
+        self.saved_time = state["time"]
+        if time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def checkpoint(self, state):
+        # 结束当前段(在后台压缩)，开始新的一段并写入完整检查点
+        self.close_segment()
+        filename = os.path.join(self.path, f"{self.next_segment:06d}.log")
+        self.next_segment += 1
+        self.file = open(filename, "wb")
+        self.previous = castle_core.snapshot(state)
+        self.codec = DeltaCodec(self.previous)
+        self.checkpoint_time = state["time"]
+        self.file.write(frame(RECORD_CHECKPOINT, repr(self.previous).encode("utf-8")))
+        self.flush()
+
+    def flush(self):
+        # 把已写入的记录同步到磁盘
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.last_flush = time.monotonic()
+
+    def close_segment(self):
+        # 关闭当前段并安排后台压缩
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.start_compaction(self.file.name)
+        self.file = None
+
+    def start_compaction(self, filename):
+        # 在后台线程中压缩一个段
+        self.compactors = [thread for thread in self.compactors if thread.is_alive()]
+        thread = threading.Thread(target=compact, args=(filename,), daemon=True)
+        thread.start()
+        self.compactors.append(thread)
+
+    def close(self):
+        # 关闭日志，等待所有压缩完成
+        self.close_segment()
+        for thread in self.compactors:
+            thread.join()
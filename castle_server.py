@@ -0,0 +1,287 @@
+# 模拟城堡本地模拟服务器 - 在一个进程里用asyncio同时运行大量无界面殖民地
+# 外部工具通过本地TCP连接发送一行一个的JSON请求:
+#   {"op": "create"}                                          创建殖民地，返回{"ok": true, "colony": 编号}
+#   {"op": "list"}                                            列出所有殖民地编号
+#   {"op": "state", "colony": 编号}                            取完整状态
+#   {"op": "command", "colony": 编号, "command": "hire", "args": ["farmer"]}
+#                                                             执行玩家命令(见castle_core.perform)
+#   {"op": "subscribe", "colony": 编号} / {"op": "unsubscribe", "colony": 编号}
+#                                                             订阅后每次推进都会收到状态变化
+# 每个请求都返回一行JSON；订阅推送的格式为{"event": "delta", "colony": 编号, "delta": {...}}。
+# 接收过慢的订阅者会被取消订阅并收到{"event": "dropped", "colony": 编号}，重新订阅即可继续。
+# 所有殖民地在同一个循环里批量推进，不为殖民地或连接创建线程。
+#
+# 使用 --metrics=文件 或 --metrics-port=端口 时导出每个殖民地的指标(见castle_metrics)。
+#
+# 用法: python castle_server.py [--port=8765] [--tick-rate=1] [--colonies=0] [--metrics=文件] [--metrics-port=端口]
+import asyncio
+import json
+import sys
+import time
+
+import castle_core
+import castle_metrics
+
+# 订阅者未发送的数据超过该字节数时断开订阅，避免慢连接拖垮服务器
+MAX_BUFFERED = 1 << 20
+
+# 允许远程执行的命令及其参数: 名称类参数必须给出，count和priority可以省略
+#   worker/building/society: 规则表中的键  count: 不小于1的整数
+#   priority: castle_core.PRIORITY_URGENT或PRIORITY_NORMAL  branch: 分支名称(字符串)
+COMMANDS = {
+    "hire": ("worker", "count"),
+    "build_house": ("building", "count", "priority"),
+    "build_society": ("society", "priority"),
+    "build_research": ("priority",),
+    "cheat": (),
+    "undo": (),
+    "save_branch": ("branch",),
+    "switch_branch": ("branch",)
+}
+
+# 可以省略的参数
+OPTIONAL_ARGS = {"count", "priority"}
+
+
+def check_args(command, args):
+    # 检查远程命令的参数，避免负数数量、未知名称等进入castle_core.perform
+    # 参数:
+    #   command: 命令名(COMMANDS中的键)
+    #   args: 参数列表
+    # 返回:
+    #   参数无效时返回错误说明，否则返回None
+    kinds = COMMANDS[command]
+    if not isinstance(args, list):
+        return "args必须是列表"
+    required = sum(1 for kind in kinds if kind not in OPTIONAL_ARGS)
+    if not required <= len(args) <= len(kinds):
+        return f"{command}需要{required}到{len(kinds)}个参数"
+    tables = {"worker": castle_core.WORKER_RULES, "building": castle_core.BUILDING_RULES,
+              "society": castle_core.SOCIETY_RULES}
+    for kind, value in zip(kinds, args):
+        if kind in tables:
+            if not isinstance(value, str) or value not in tables[kind]:
+                return f"未知的{kind}: {value}"
+        elif kind == "count":
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                return f"数量必须是不小于1的整数: {value}"
+        elif kind == "priority":
+            if value not in (castle_core.PRIORITY_URGENT, castle_core.PRIORITY_NORMAL) or isinstance(value, bool):
+                return f"无效的优先级: {value}"
+        elif not isinstance(value, str):
+            return f"分支名称必须是字符串: {value}"
+    return None
+
+
+class Colony:
+    # 一个殖民地
+    # 属性:
+    #   state: 游戏状态
+    #   history: 撤销历史
+    #   subscribers: 订阅状态变化的连接(StreamWriter)
+    #   published: 上一次推送给订阅者时的快照
+    #   metrics: 指标(ColonyMetrics，未启用指标时为None)
+
+    def __init__(self, tick_rate, metrics=None):
+        self.state = castle_core.new_game(tick_rate)
+        self.history = castle_core.History(limit=20)
+        self.subscribers = set()
+        self.published = None
+        self.metrics = metrics
+
+
+class ColonyServer:
+    # 殖民地服务器
+    # 属性:
+    #   colonies: 殖民地编号到Colony
+    #   tick_rate: 每秒推进的次数
+    #   server: asyncio服务器
+    #   metrics: 指标导出器(castle_metrics.Metrics，可选)
+
+    def __init__(self, tick_rate=1, metrics=None):
+        # 参数:
+        #   tick_rate: 每秒推进的次数(默认1)
+        #   metrics: 指标导出器(可选)
+        self.colonies = {}
+        self.metrics = metrics
+        self.next_id = 1
+        self.tick_rate = tick_rate
+        self.server = None
+        self.ticker = None
+
+    def create(self):
+        # 创建新殖民地，返回编号
+        colony_id = self.next_id
+        self.next_id += 1
+        metrics = self.metrics.colony(colony_id) if self.metrics is not None else None
+        self.colonies[colony_id] = Colony(self.tick_rate, metrics)
+        return colony_id
+
+    async def start(self, host="127.0.0.1", port=0):
+        # 开始监听并启动推进循环
+        # 参数:
+        #   host: 监听地址(默认只监听本机)
+        #   port: 端口，0表示由系统分配
+        # 返回:
+        #   实际监听的端口
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.ticker = asyncio.create_task(self.tick_loop())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        # 停止服务器
+        self.ticker.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def tick_loop(self):
+        # 批量推进所有殖民地；按真实时间计算应推进的次数，落后时一次补齐
+        start = time.monotonic()
+        done = 0
+        while True:
+            await asyncio.sleep(1 / self.tick_rate)
+            elapsed = time.monotonic() - start
+            due = int(elapsed * self.tick_rate) - done
+            if due <= 0:
+                continue
+            lag = elapsed - (done + 1) / self.tick_rate
+            done += due
+            self.advance(due, lag)
+
+    def advance(self, ticks, lag=0.0):
+        # 把所有殖民地推进ticks次，并把变化推送给订阅者
+        # 参数:
+        #   ticks: 推进次数
+        #   lag: 本次推进落后于真实时间的秒数(记入指标)
+        for colony_id, colony in self.colonies.items():
+            castle_core.tick(colony.state, ticks)
+            if colony.subscribers:
+                self.publish(colony_id, colony)
+        if self.metrics is not None:
+            publish = self.metrics.due()
+            for colony in self.colonies.values():
+                colony.metrics.ticks += ticks
+                colony.metrics.lag = lag
+                if publish:
+                    colony.metrics.publish(colony.state)
+
+    def publish(self, colony_id, colony):
+        # 把殖民地自上次推送以来的变化发送给所有订阅者
+        delta = castle_core.diff(colony.published, colony.state)
+        colony.published = castle_core.snapshot(colony.state, colony.published)
+        if not delta:
+            return
+        line = encode({"event": "delta", "colony": colony_id, "delta": delta})
+        for writer in list(colony.subscribers):
+            if writer.is_closing():
+                colony.subscribers.discard(writer)
+            elif writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                # 告诉订阅者它已不再收到变化，否则客户端会一直显示停住的状态
+                colony.subscribers.discard(writer)
+                writer.write(encode({"event": "dropped", "colony": colony_id}))
+            else:
+                writer.write(line)
+
+    async def handle(self, reader, writer):
+        # 处理一个连接: 逐行读取请求并回复
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.dispatch(json.loads(line), writer)
+                except (ValueError, KeyError, TypeError, IndexError) as error:
+                    reply = {"ok": False, "error": f"无效请求: {error}"}
+                writer.write(encode(reply))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for colony in self.colonies.values():
+                colony.subscribers.discard(writer)
+            writer.close()
+
+    def dispatch(self, request, writer):
+        # 执行一条请求，返回回复内容
+        op = request["op"]
+        if op == "create":
+            return {"ok": True, "colony": self.create()}
+        if op == "list":
+            return {"ok": True, "colonies": list(self.colonies)}
+
+        colony_id = request["colony"]
+        colony = self.colonies.get(colony_id)
+        if colony is None:
+            return {"ok": False, "error": f"没有编号为{colony_id}的殖民地"}
+        if op == "state":
+            return {"ok": True, "colony": colony_id, "state": colony.state}
+        if op == "subscribe":
+            # 推送基准由所有订阅者共用: 已有订阅者时先把尚未推送的变化发给他们，
+            # 此后基准与当前状态一致，新订阅者从回复中的完整状态开始
+            if colony.subscribers:
+                self.publish(colony_id, colony)
+            else:
+                colony.published = castle_core.snapshot(colony.state)
+            colony.subscribers.add(writer)
+            return {"ok": True, "colony": colony_id, "state": colony.state}
+        if op == "unsubscribe":
+            colony.subscribers.discard(writer)
+            return {"ok": True}
+        if op == "command":
+            command = request["command"]
+            if command not in COMMANDS:
+                return {"ok": False, "error": f"未知命令{command}"}
+            args = request.get("args", [])
+            problem = check_args(command, args)
+            if problem is not None:
+                return {"ok": False, "error": f"无效参数: {problem}"}
+            error = castle_core.perform(colony.state, colony.history, command, *args)
+            if colony.metrics is not None:
+                colony.metrics.action(error)
+            if error:
+                return {"ok": False, "error": list(error)}
+            return {"ok": True}
+        return {"ok": False, "error": f"未知操作{op}"}
+
+
+def encode(message):
+    # 把消息编码为一行JSON
+    return (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+async def serve(port, tick_rate, colonies, metrics=None):
+    # 启动服务器并一直运行
+    server = ColonyServer(tick_rate, metrics)
+    for _ in range(colonies):
+        server.create()
+    port = await server.start(port=port)
+    print(f"模拟服务器已启动: 127.0.0.1:{port}")
+    await asyncio.Event().wait()
+
+
+def main():
+    # 解析命令行参数并启动服务器
+    options = {"port": 8765, "tick-rate": 1, "colonies": 0, "metrics-port": None}
+    metrics_path = None
+    for arg in sys.argv[1:]:
+        name, _, value = arg.lstrip("-").partition("=")
+        if name == "metrics":
+            metrics_path = value
+        elif name in options:
+            options[name] = int(value)
+    metrics = None
+    if metrics_path is not None or options["metrics-port"] is not None:
+        metrics = castle_metrics.Metrics(metrics_path, options["metrics-port"])
+        metrics.start()
+    try:
+        asyncio.run(serve(options["port"], options["tick-rate"], options["colonies"], metrics))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics is not None:
+            metrics.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+# 模拟城堡平衡调参工具 - 扫描花费和建筑点等参数，评估每组参数下最快通关(建成研究中心)的时间
+# 每组参数在进程池中用无界面快进模拟评估所有候选策略(见castle_planner.STRATEGIES)，取最快的一个；
+# 候选策略中包括建造建筑社、工人房并雇佣建筑工的策略，建筑工和工人房的花费因此会影响结果。
+# 结果按完整规则和候选策略表的哈希缓存到文件，重复扫描时只计算新的参数组合。
+#
+# 参数用规则字典中的点分路径表示(规则字典格式见castle_core.load_rules):
+#   workers.farmer.cost.food   农民的食物花费，取值直接替换原值
+#   buildings.farm.cost        农屋的全部花费，取值为倍数
+#   research.required          研究中心需要的建筑点
+# 搜索空间文件(JSON)为 {参数: [候选值, ...]}，不指定时使用DEFAULT_SPACE。
+#
+# 搜索方式:
+#   grid    网格搜索，评估所有组合
+#   random  随机搜索，评估trials组随机组合
+#   bayes   贝叶斯优化(树结构Parzen估计)，根据已评估的结果偏向好的取值
+#
+# 用法: python castle_tuner.py [--space=文件] [--search=grid|random|bayes] [--trials=50]
+#                             [--target=秒] [--workers=N] [--cache=文件] [--rules=规则文件]
+import concurrent.futures
+import copy
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+
+import castle_core
+import castle_planner
+
+# 默认搜索空间
+DEFAULT_SPACE = {
+    "workers.farmer.cost.food": [10, 20, 40],
+    "buildings.farm.cost": [0.5, 1, 2],
+    "societies.建筑社.cost": [0.5, 1, 2],
+    "workers.builder.cost": [0.5, 1, 2],
+    "buildings.worker_house.cost": [0.5, 1, 2],
+    "research.required": [250, 500, 1000]
+}
+
+# 缓存文件
+CACHE_PATH = "castle_tuner_cache.json"
+
+# 最长模拟时间(秒)
+HORIZON = castle_planner.HORIZON
+
+# 缓存格式版本，模拟方式(如simulate_win)改变时加一，使旧的缓存结果失效
+CACHE_VERSION = 2
+
+# 贝叶斯优化: 先随机评估的组数，以及被视为"好"结果的比例
+BAYES_STARTUP = 10
+BAYES_GAMMA = 0.25
+
+
+def base_rules():
+    # 当前规则表的副本(规则字典格式)
+    return copy.deepcopy({
+        "resources": castle_core.RESOURCE_NAMES,
+        "workers": castle_core.WORKER_RULES,
+        "buildings": castle_core.BUILDING_RULES,
+        "societies": castle_core.SOCIETY_RULES,
+        "research": castle_core.RESEARCH_RULES
+    })
+
+
+def rules_with(base, params):
+    # 把一组参数应用到规则字典上
+    # 参数:
+    #   base: 基准规则字典
+    #   params: {参数路径: 取值}
+    # 返回:
+    #   新的规则字典
+    rules = copy.deepcopy(base)
+    for path, value in params.items():
+        *parents, last = path.split(".")
+        section = rules
+        for name in parents:
+            section = section[name]
+        if last not in section:
+            raise KeyError(f"规则中没有{path}")
+        if isinstance(section[last], dict):
+            # 指向整个花费时按倍数缩放每一项；每项至少为1，花费为0时castle_core.affordable_count无法计算
+            section[last] = {key: max(1, round(amount * value)) for key, amount in section[last].items()}
+        elif parents and parents[-1] == "cost" and value < 1:
+            raise ValueError(f"{path}的花费必须不小于1: {value}")
+        else:
+            section[last] = value
+    return rules
+
+
+def rules_hash(rules):
+    # 规则字典的哈希，作为缓存的键；候选策略表也会影响结果，一起计入
+    text = json.dumps([rules, HORIZON, castle_planner.STRATEGIES, CACHE_VERSION], sort_keys=True,
+                      ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def simulate_win(strategy, horizon=HORIZON):
+    # 从新游戏开始按策略快进，负担得起研究中心时立即优先建造
+    # 参数:
+    #   strategy: 策略名称
+    #   horizon: 最长模拟秒数
+    # 返回:
+    #   研究中心建成时的秒数；超出模拟时间时返回None
+    workers = castle_planner.STRATEGIES[strategy]
+    cost = castle_core.RESEARCH_RULES["cost"]
+    state = castle_core.new_game()
+    for _ in range(horizon):
+        research = state["research"]
+        if not research["building"] and not research["built"]:
+            if castle_core.check_cost(state["resources"], cost) is not None:
+                castle_planner.run_strategy(state, workers)
+            if castle_core.check_cost(state["resources"], cost) is None:
+                castle_core.build_research(state, castle_core.PRIORITY_URGENT)
+        else:
+            castle_planner.run_strategy(state, workers)
+        if "research_done" in castle_core.advance(state, 1):
+            return state["time"]
+    return None
+
+
+def evaluate(rules, horizon=HORIZON):
+    # 在工作进程中评估一套规则: 依次模拟每个策略，返回最快的(秒数, 策略)
+    castle_core.apply_rules(rules)
+    best = (None, None)
+    for strategy in castle_planner.STRATEGIES:
+        seconds = simulate_win(strategy, horizon if best[0] is None else best[0])
+        if seconds is not None and (best[0] is None or seconds < best[0]):
+            best = (seconds, strategy)
+    return best
+
+
+def score(seconds, target=None):
+    # 结果的得分，越小越好；给出目标时间时按与目标的差距计算
+    if seconds is None:
+        return float("inf")
+    return seconds if target is None else abs(seconds - target)
+
+
+def grid_points(space):
+    # 网格搜索的所有组合
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def random_point(space, rng):
+    # 随机取一组参数
+    return {name: rng.choice(values) for name, values in space.items()}
+
+
+def bayes_point(space, observed, rng, candidates=24):
+    # 树结构Parzen估计: 把已评估的参数按得分分成好、坏两组，
+    # 从好组的取值分布中抽取候选，选好组与坏组概率之比最大的一个
+    # 参数:
+    #   space: 搜索空间
+    #   observed: [(参数, 得分)]
+    #   rng: 随机数生成器
+    #   candidates: 每次比较的候选数量
+    if len(observed) < BAYES_STARTUP:
+        return random_point(space, rng)
+    ranked = sorted(observed, key=lambda item: item[1])
+    split = max(1, int(len(ranked) * BAYES_GAMMA))
+    good = [params for params, _ in ranked[:split]]
+    bad = [params for params, _ in ranked[split:]]
+
+    def density(group, name, value):
+        # 带平滑的取值频率
+        return (sum(1 for params in group if params[name] == value) + 1) / (len(group) + len(space[name]))
+
+    best, best_ratio = None, -1
+    for _ in range(candidates):
+        point = {}
+        ratio = 1
+        for name, values in space.items():
+            weights = [density(good, name, value) for value in values]
+            point[name] = rng.choices(values, weights)[0]
+            ratio *= density(good, name, point[name]) / density(bad, name, point[name])
+        if ratio > best_ratio:
+            best, best_ratio = point, ratio
+    return best
+
+
+def load_cache(path):
+    # 读取缓存文件，不存在时返回空字典
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cache(path, cache):
+    # 写入缓存文件(先写临时文件再替换，中断时不会损坏原文件)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def sweep(space, search="grid", trials=50, target=None, workers=None, cache_path=CACHE_PATH, seed=0):
+    # 扫描参数空间
+    # 参数:
+    #   space: {参数路径: [候选值]}
+    #   search: "grid"、"random"或"bayes"
+    #   trials: 随机和贝叶斯搜索评估的参数组数
+    #   target: 目标通关时间(秒，可选)，给出时按与目标的差距排序，否则按通关时间排序
+    #   workers: 进程池大小(默认为CPU数)
+    #   cache_path: 缓存文件路径
+    #   seed: 随机种子
+    # 返回:
+    #   [(得分, 参数, 秒数, 策略)]，按得分从好到差排列
+    base = base_rules()
+    # 先检查每个候选值(如花费不能为0)，不要扫描到一半才因无效参数中断
+    for path, values in space.items():
+        for value in values:
+            rules_with(base, {path: value})
+    cache = load_cache(cache_path)
+    rng = random.Random(seed)
+    results = {}
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        def run(points):
+            # 评估一批参数，已缓存的直接取结果
+            pending = {}
+            for params in points:
+                rules = rules_with(base, params)
+                key = rules_hash(rules)
+                if key in results:
+                    continue
+                if key in cache:
+                    results[key] = (params, cache[key]["seconds"], cache[key]["strategy"])
+                elif key not in pending:
+                    pending[key] = (params, pool.submit(evaluate, rules))
+            for key, (params, future) in pending.items():
+                seconds, strategy = future.result()
+                results[key] = (params, seconds, strategy)
+                cache[key] = {"params": params, "seconds": seconds, "strategy": strategy}
+            if pending:
+                save_cache(cache_path, cache)
+
+        if search == "grid":
+            run(grid_points(space))
+        else:
+            # 每批提交与进程池大小相同的参数组，批与批之间根据结果调整后续的取样
+            batch = workers or os.cpu_count() or 1
+            attempts = 0
+            while len(results) < trials and attempts < trials * 10:
+                observed = [(params, score(seconds, target)) for params, seconds, _ in results.values()]
+                if search == "bayes":
+                    points = [bayes_point(space, observed, rng) for _ in range(batch)]
+                else:
+                    points = [random_point(space, rng) for _ in range(batch)]
+                attempts += batch
+                run(points[:trials - len(results)])
+
+    ranked = [(score(seconds, target), params, seconds, strategy) for params, seconds, strategy in results.values()]
+    ranked.sort(key=lambda item: item[0])
+    return ranked
+
+
+def main():
+    # 解析命令行参数，运行扫描并打印最好的结果
+    options = {"search": "grid", "trials": "50", "cache": CACHE_PATH}
+    for arg in sys.argv[1:]:
+        name, _, value = arg.lstrip("-").partition("=")
+        options[name] = value
+    if "rules" in options:
+        castle_core.load_rules(options["rules"])
+    space = DEFAULT_SPACE
+    if "space" in options:
+        with open(options["space"], encoding="utf-8") as f:
+            space = json.load(f)
+    target = int(options["target"]) if "target" in options else None
+    workers = int(options["workers"]) if "workers" in options else None
+
+    ranked = sweep(space, options["search"], int(options["trials"]), target, workers, options["cache"])
+    for _, params, seconds, strategy in ranked[:20]:
+        eta = "无法通关" if seconds is None else f"{seconds // 60}分{seconds % 60:02d}秒"
+        print(f"{eta:>10}  {strategy or '-'}  " + "  ".join(f"{name}={value}" for name, value in params.items()))
+
+
+if __name__ == "__main__":
+    main()
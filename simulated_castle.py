@@ -1,1008 +1,745 @@
-# 模拟城堡游戏 - 资源管理与城市建设模拟器
-# 这是一个使用tkinter构建的城堡模拟游戏，玩家需要管理资源、雇佣工人、建造建筑，
-# 最终目标是建造研究中心完成游戏。
-import tkinter as tk
-from tkinter import ttk 
-from tkinter import messagebox
-
-class Tooltip:
-    # 工具提示类，用于在鼠标悬停时显示提示信息
-    # 属性:
-    #   widget: 绑定提示的控件
-    #   text: 提示文本内容 
-    #   delay: 显示延迟(毫秒)
-    #   tooltip: 提示窗口对象
-    #   tooltip_id: 定时器ID
-    
-    def __init__(self, widget, text, delay=800):
-        # 初始化工具提示
-        # 参数:
-        #   widget: 要绑定提示的控件
-        #   text: 提示文本内容
-        #   delay: 显示延迟(毫秒，默认800)
-        self.widget = widget
-        self.text = text
-        self.delay =delay
-        self.tooltip = None
-        self.tooltip_id = None
-        self.widget.bind("<Enter>", self.schedule_show)
-        self.widget.bind("<Leave>", self.hide)
-
-    def schedule_show(self, event=None):
-        # 安排显示工具提示(鼠标进入时调用)
-        # 参数:
-        #   event: 鼠标事件(可选)
-        self.tooltip_id = self.widget.after(self.delay, self.show)    
-
-    def show(self):
-        # 显示工具提示窗口
-        # 计算位置并创建提示窗口
-        x, y, _, _ = self.widget.bbox("insert")
-        x += self.widget.winfo_rootx() + 25
-        y += self.widget.winfo_rooty() + 25
-        
-        self.tooltip = tk.Toplevel(self.widget)
-        self.tooltip.wm_overrideredirect(True)
-        self.tooltip.wm_geometry(f"+{x}+{y}")
-        
-        label = tk.Label(self.tooltip, text=self.text, background="#ffffe0", 
-                        relief="solid", borderwidth=1, font=("隶书", 15))
-        label.pack()
-
-    def hide(self, event=None):
-        # 隐藏工具提示(鼠标离开时调用)
-        # 参数:
-        #   event: 鼠标事件(可选)
-        if self.tooltip:
-            self.tooltip.destroy()
-            self.tooltip = None
-        if self.tooltip_id:
-            self.widget.after_cancel(self.tooltip_id)
-            self.tooltip_id = None
-
-
-# 全局资源变量 - 存储游戏中的四种资源数量
-resources = {
-    "food": 150,
-    "wood": 0,
-    "stone": 0,
-    "iron": 0
-}
-
-# 全局工人数量 - 存储五种工人的数量
-workers = {
-    "farmer": 0,
-    "lumber": 0,
-    "quarry": 0,
-    "mine": 0,
-    "builder": 0
-}
-
-def update_resources():
-    # 更新资源数量(每秒调用一次)
-    # 根据当前工人数量计算资源产量并更新UI显示
-    # 农民生产
-    food_produced = workers["farmer"] * 1  # 每个农民每秒生产1食物
-    resources["food"] += food_produced
-    
-    # 伐木工生产
-    if workers["lumber"] > 0:
-        wood_produced = workers["lumber"] * 1
-        resources["wood"] += wood_produced
-            
-    # 采石工生产
-    if workers["quarry"] > 0:
-        stone_produced = workers["quarry"] * 1
-        resources["stone"] += stone_produced
-            
-    # 铁矿工生产
-    if workers["mine"] > 0:
-        iron_produced = workers["mine"] * 1
-        resources["iron"] += iron_produced
-        
-    
-    # 更新UI显示
-    resource_labels["food"].config(text=f"食物: {resources['food']}")
-    resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-    resource_labels["stone"].config(text=f"石头: {resources['stone']}")
-    resource_labels["iron"].config(text=f"铁矿: {resources['iron']}")
-    
-    # 设置下一次更新
-    root.after(1000, update_resources)
-
-def start_new_game():
-    # 开始新游戏
-    # 初始化游戏界面，创建资源显示、工人管理、建筑管理等UI元素
-    # 隐藏主菜单
-    button_frame.pack_forget()
-    
-    # 创建游戏主界面
-    game_frame = tk.Frame(root)                                                 
-    game_frame.pack(expand=True, fill="both", padx=20, pady=20)                      
-    
-    # 创建信息显示容器
-    info_container = tk.Frame(game_frame)
-    info_container.pack(fill="x", pady=5)
-    
-    # 配置列权重
-    info_container.grid_columnconfigure(0, weight=1)
-    
-    # 资源信息框
-    resource_frame = tk.LabelFrame(info_container, text="资源信息", font=("隶书", 15))
-    resource_frame.grid(row=0, column=0, padx=5, sticky="ew")
-    
-    global resource_labels                                         
-    resource_labels = {
-        "food": tk.Label(resource_frame, text="食物: 0", font=("隶书", 15)),   
-        "wood": tk.Label(resource_frame, text="木头: 0", font=("隶书", 15)),
-        "stone": tk.Label(resource_frame, text="石头: 0", font=("隶书", 15)),
-        "iron": tk.Label(resource_frame, text="铁矿: 0", font=("隶书", 15))
-    }
-    resource_display_names = {                                                       
-        "food": "食物",
-        "wood": "木头", 
-        "stone": "石头",
-        "iron": "铁矿"
-    }
-    
-    for label in resource_labels.values():                                          
-        label.pack(anchor="w")
-    
-    # 启动资源更新循环
-    update_resources()
-    
-    # 第二行容器
-    row2_container = tk.Frame(info_container)
-    row2_container.grid(row=1, column=0, sticky="ew")
-    
-    # 配置第二行列权重
-    row2_container.grid_columnconfigure(0, weight=1,uniform="group1")
-    row2_container.grid_columnconfigure(1, weight=1,uniform="group1")
-    
-    # 人口信息框
-    population_frame = tk.LabelFrame(row2_container, text="人口信息", font=("隶书", 15))
-    population_frame.grid(row=0, column=0, padx=5, sticky="nsew")
-    
-    # 初始建筑数量
-    global farm_count, lumber_count, quarry_count, mine_count, worker_house_count
-    global builder_count, builder_capacity, populations, buildings, population_capacities
-    
-    farm_count = 0
-    lumber_count = 0
-    quarry_count = 0
-    mine_count = 0
-    
-    # 计算人口上限
-    farmer_capacity = farm_count * 10           
-    lumber_capacity = lumber_count * 10
-    quarry_capacity = quarry_count * 10
-    mine_capacity = mine_count * 10
-    
-    # 工人房数量
-    worker_house_count = 0
-    
-    # 建筑工数量
-    builder_count = 0
-    builder_capacity = worker_house_count * 5
-    
-    # 人口信息
-    populations = [
-        ("农  民", farmer_capacity),
-        ("伐木工", lumber_capacity),
-        ("采石工", quarry_capacity),
-        ("铁矿工", mine_capacity),
-        ("建筑工", builder_capacity)
-    ]
-    
-    # 建筑信息
-    buildings = [
-        ("农  屋", farm_count),
-        ("伐木屋", lumber_count),
-        ("采石屋", quarry_count),
-        ("铁矿屋", mine_count),
-        ("工人房", worker_house_count)
-    ]
-    
-    # 存储容量信息
-    population_capacities = {}
-    
-    for i, (name, capacity) in enumerate(populations):
-        # 存储容量
-        population_capacities[name] = capacity
-        # 人口信息
-        tk.Label(population_frame, 
-                text=f"{name}: 0000/{capacity:04d}", 
-                font=("隶书", 15)).grid(row=i, column=0, sticky="w", padx=5, pady=2)
-        
-        # 雇佣按钮
-        btn = tk.Button(population_frame,
-                       text=f"雇佣{name}",
-                       width=15,
-                       font=("隶书", 15))
-        btn.grid(row=i, column=1, padx=5, pady=2)
-            
-        # 添加雇佣按钮提示
-        if name == "农  民":
-            Tooltip(btn, "需要20食物")
-        elif name == "伐木工":
-            Tooltip(btn, "需要50食物")
-        elif name == "采石工":
-            Tooltip(btn, "需要50木头")
-        elif name == "铁矿工":
-            Tooltip(btn, "需要50石头")
-        elif name == "建筑工":
-            Tooltip(btn, "需要50食物 + 50木头 + 50石头 + 50铁矿")
-        
-        # 为农民按钮绑定点击事件
-        if name == "农  民":
-            def hire_farmer(name, row):
-                # 获取当前农民数量和容量
-                capacity = population_capacities["农  民"]
-                for widget in population_frame.grid_slaves(row=row, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        
-                        # 检查食物和居住空间
-                        if current_count >= capacity:
-                            messagebox.showwarning("居住空间不足", "没有足够的农屋来容纳更多农民")
-                            return
-                        if resources["food"] < 20:
-                            messagebox.showwarning("食物不足", "需要20食物来雇佣农民")
-                            return
-                        
-                            
-                        # 执行雇佣
-                        resources["food"] -= 20
-                        workers["farmer"] += 1
-                        resource_labels["food"].config(text=f"食物: {resources['food']}")
-                        current_count += 1
-                        widget.config(text=f"{name}: {current_count:04d}/{capacity:04d}")
-            
-            btn.config(command=lambda name=name, i=i: hire_farmer(name, i))
-
-        # 为伐木工按钮绑定点击事件 
-        if name == "伐木工":
-            def hire_lumber(name, row):
-                # 获取当前伐木工数量和容量
-                capacity = population_capacities["伐木工"]
-                for widget in population_frame.grid_slaves(row=row, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        
-                        # 检查食物和居住空间
-                        if current_count >= capacity:
-                            messagebox.showwarning("居住空间不足", "没有足够的伐木屋来容纳更多伐木工")
-                            return
-                        if resources["food"] < 50:
-                            messagebox.showwarning("食物不足", "需要50食物来雇佣伐木工")
-                            return
-                        
-                            
-                        # 执行雇佣
-                        resources["food"] -= 50
-                        workers["lumber"] += 1
-                        resource_labels["food"].config(text=f"食物: {resources['food']}")
-                        current_count += 1
-                        widget.config(text=f"{name}: {current_count:04d}/{capacity:04d}") 
-            btn.config(command=lambda name=name, i=i: hire_lumber(name, i))
- 
-        # 为采石工按钮绑定点击事件
-        if name ==  "采石工":
-            def hire_quarry(name, row): 
-                # 获取当前采石工数量和容量
-                capacity = population_capacities["采石工"]
-                for widget in population_frame.grid_slaves(row=row, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        
-                        # 检查石头和居住空间
-                        if current_count >= capacity:
-                            messagebox.showwarning("居住空间不足", "没有足够的采石屋来容纳更多采石工")
-                            return
-                        if resources["wood"] < 50:
-                            messagebox.showwarning("木头不足", "需要50木头来雇佣采石工")
-                            return
-                        
-                            
-                        # 执行雇佣
-                        resources["wood"] -= 50
-                        workers["quarry"] += 1
-                        resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-                        current_count += 1
-                        widget.config(text=f"{name}: {current_count:04d}/{capacity:04d}")
-            btn.config(command=lambda name=name, i=i: hire_quarry(name, i))
-
-        # 为铁矿工按钮绑定点击事件
-        if name == "铁矿工":
-            def hire_mine(name, row):
-                # 获取当前铁矿工数量和容量
-                capacity = population_capacities["铁矿工"]
-                for widget in population_frame.grid_slaves(row=row, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        
-                        # 检查铁矿和居住空间
-                        if current_count >= capacity:
-                            messagebox.showwarning("居住空间不足", "没有足够的铁矿屋来容纳更多铁矿工")
-                            return
-                        if resources["stone"] < 50:
-                            messagebox.showwarning("石头不足", "需要50石头来雇佣铁矿工")
-                            return
-                        
-                            
-                        # 执行雇佣
-                        resources["stone"] -= 50
-                        workers["mine"] += 1
-                        resource_labels["stone"].config(text=f"石头: {resources['stone']}")
-                        current_count += 1
-                        widget.config(text=f"{name}: {current_count:04d}/{capacity:04d}")
-            btn.config(command=lambda name=name, i=i: hire_mine(name, i))            
-
-        # 为建筑工按钮绑定点击事件
-        if name ==  "建筑工":
-            def hire_builder(name, row):
-                # 获取当前建筑工数量和容量
-                capacity = population_capacities["建筑工"]
-                for widget in population_frame.grid_slaves(row=row, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        
-                        # 检查资源和居住空间
-                        if current_count >= capacity:
-                            messagebox.showwarning("居住空间不足", "没有足够的工人房来容纳更多建筑工")
-                            return
-                        if resources["food"] < 50:
-                            messagebox.showwarning("食物不足", "需要50食物来雇佣建筑工")
-                            return
-                        if resources["wood"] < 50:
-                            messagebox.showwarning("木头不足", "需要50木头来雇佣建筑工")
-                            return
-                        if resources["stone"] < 50:
-                            messagebox.showwarning("石头不足", "需要50石头来雇佣建筑工")
-                            return
-                        if resources["iron"] < 50:
-                            messagebox.showwarning("铁矿不足", "需要50铁矿来雇佣建筑工")
-                            return
-                        
-                            
-                        # 执行雇佣
-                        resources["food"] -= 50
-                        resources["wood"] -= 50
-                        resources["stone"] -= 50
-                        resources["iron"] -= 50
-                        workers["builder"] += 1
-                        resource_labels["food"].config(text=f"食物: {resources['food']}")
-                        resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-                        resource_labels["stone"].config(text=f"石头: {resources['stone']}")
-                        resource_labels["iron"].config(text=f"铁矿: {resources['iron']}")
-                        current_count += 1
-                        widget.config(text=f"{name}: {current_count:04d}/{capacity:04d}")
-            btn.config(command=lambda name=name, i=i: hire_builder(name, i))
-
-    # 建筑信息框
-    building_frame = tk.LabelFrame(row2_container, text="建筑信息", font=("隶书", 15))
-    building_frame.grid(row=0, column=1, padx=5, sticky="nsew")
-
-    for i, (name, count) in enumerate(buildings):
-
-        # 建筑信息标签
-        tk.Label(building_frame, 
-                text=f"{name}: {count:03d} ", 
-                font=("隶书", 15)).grid(row=i, column=0, sticky="w", padx=5, pady=2)
-        
-        # 建造按钮
-        btn = tk.Button(building_frame,
-                       text=f"建造{name}",
-                       width=15,
-                       font=("隶书", 15))
-        btn.grid(row=i, column=1, padx=5, pady=2)
-        
-        # 添加建造按钮提示
-        if name == "农  屋":
-            Tooltip(btn, "需要200食物")
-        elif name == "伐木屋":
-            Tooltip(btn, "需要200木头")
-        elif name == "采石屋":
-            Tooltip(btn, "需要200石头")
-        elif name == "铁矿屋":
-            Tooltip(btn, "需要200铁矿")
-        elif name == "工人房":
-            Tooltip(btn, "需要500食物 + 500木头 + 500石头 + 500铁矿")        
-        
-        # 为农屋按钮绑定点击事件
-        if name == "农  屋":
-            def build_farm():
-                global farm_count, resource_labels, population_capacities, populations, buildings
-                # 检查是否拥有农业社
-                if not industry_built["农业社"]:
-                    messagebox.showwarning("缺少农业社", "需要先建造农业社才能建造农屋")
-                    return
-                    
-                # 检查食物是否足够
-                if resources["food"] < 200:
-                    messagebox.showwarning("食物不足", "需要200食物来建造农屋")
-                    return
-                
-                # 扣除食物
-                resources["food"] -= 200
-                resource_labels["food"].config(text=f"食物: {resources['food']}")
-                
-                # 增加农屋数量
-                farm_count += 1
-                buildings[0] = ("农  屋", farm_count)
-                
-                # 更新农民容量
-                farmer_capacity = farm_count * 10 + (1 if industry_built["农业社"] else 0) * 10
-                population_capacities["农  民"] = farmer_capacity
-                populations[0] = ("农  民", farmer_capacity)
-                
-                # 更新建筑信息显示
-                for widget in building_frame.grid_slaves(row=0, column=0):
-                    if isinstance(widget, tk.Label):
-                        widget.config(text=f"农  屋: {farm_count:03d}")
-                
-                # 更新农民容量显示
-                for widget in population_frame.grid_slaves(row=0, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        widget.config(text=f"农  民: {current_count:04d}/{farmer_capacity:04d}")
-                
-                # 更新工人房信息
-                for widget in building_frame.grid_slaves(row=4, column=0):
-                    if isinstance(widget, tk.Label):
-                        widget.config(text=f"工人房: {worker_house_count:03d}")
-            
-            btn.config(command=build_farm)
-            
-        # 为伐木屋按钮绑定点击事件
-        elif name == "伐木屋":
-            def build_lumber():
-                global lumber_count, resource_labels, population_capacities, populations, buildings
-                # 检查是否拥有林业社
-                if not industry_built["林业社"]:
-                    messagebox.showwarning("缺少林业社", "需要先建造林业社才能建造伐木屋")
-                    return
-                    
-                # 检查木头是否足够
-                if resources["wood"] < 200:
-                    messagebox.showwarning("木头不足", "需要200木头来建造伐木屋")
-                    return
-                
-                # 扣除木头
-                resources["wood"] -= 200
-                resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-                
-                # 增加伐木屋数量
-                lumber_count += 1
-                buildings[1] = ("伐木屋", lumber_count)
-                
-                # 更新伐木工容量
-                lumber_capacity = lumber_count * 10 + (1 if industry_built["林业社"] else 0) * 10
-                population_capacities["伐木工"] = lumber_capacity
-                populations[1] = ("伐木工", lumber_capacity)
-                
-                # 更新建筑信息显示
-                for widget in building_frame.grid_slaves(row=1, column=0):
-                    if isinstance(widget, tk.Label):
-                        widget.config(text=f"伐木屋: {lumber_count:03d}")
-                
-                # 更新伐木工容量显示
-                for widget in population_frame.grid_slaves(row=1, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        widget.config(text=f"伐木工: {current_count:04d}/{lumber_capacity:04d}")
-            
-            btn.config(command=build_lumber)
-            
-        # 为采石屋按钮绑定点击事件
-        elif name == "采石屋":
-            def build_quarry_house():
-                global quarry_count, resource_labels, population_capacities, populations, buildings
-                # 检查是否拥有采石社
-                if not industry_built["采石社"]:
-                    messagebox.showwarning("缺少采石社", "需要先建造采石社才能建造采石屋")
-                    return
-                    
-                # 检查石头是否足够
-                if resources["stone"] < 200:
-                    messagebox.showwarning("石头不足", "需要200石头来建造采石屋")
-                    return
-                
-                # 扣除石头
-                resources["stone"] -= 200
-                resource_labels["stone"].config(text=f"石头: {resources['stone']}")
-                
-                # 增加采石屋数量
-                quarry_count += 1
-                buildings[2] = ("采石屋", quarry_count)
-                
-                # 更新采石工容量
-                quarry_capacity = quarry_count * 10 + (1 if industry_built["采石社"] else 0) * 10
-                population_capacities["采石工"] = quarry_capacity
-                populations[2] = ("采石工", quarry_capacity)
-                
-                # 更新建筑信息显示
-                for widget in building_frame.grid_slaves(row=2, column=0):
-                    if isinstance(widget, tk.Label):
-                        widget.config(text=f"采石屋: {quarry_count:03d}")
-                
-                # 更新采石工容量显示
-                for widget in population_frame.grid_slaves(row=2, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        widget.config(text=f"采石工: {current_count:04d}/{quarry_capacity:04d}")
-            
-            btn.config(command=build_quarry_house)
-            
-        # 为铁矿屋按钮绑定点击事件
-        elif name == "铁矿屋":
-            def build_mine_house():
-                global mine_count, resource_labels, population_capacities, populations, buildings
-                # 检查是否拥有铁矿社
-                if not industry_built["铁矿社"]:
-                    messagebox.showwarning("缺少铁矿社", "需要先建造铁矿社才能建造铁矿屋")
-                    return
-                    
-                # 检查铁矿是否足够
-                if resources["iron"] < 200:
-                    messagebox.showwarning("铁矿不足", "需要200铁矿来建造铁矿屋")
-                    return
-                
-                # 扣除铁矿
-                resources["iron"] -= 200
-                resource_labels["iron"].config(text=f"铁矿: {resources['iron']}")
-                
-                # 增加铁矿屋数量
-                mine_count += 1
-                buildings[3] = ("铁矿屋", mine_count)
-                
-                # 更新铁矿工容量
-                mine_capacity = mine_count * 10 + (1 if industry_built["铁矿社"] else 0) * 10
-                population_capacities["铁矿工"] = mine_capacity
-                populations[3] = ("铁矿工", mine_capacity)
-                
-                # 更新建筑信息显示
-                for widget in building_frame.grid_slaves(row=3, column=0):
-                    if isinstance(widget, tk.Label):
-                        widget.config(text=f"铁矿屋: {mine_count:03d}")
-                
-                # 更新铁矿工容量显示
-                for widget in population_frame.grid_slaves(row=3, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        widget.config(text=f"铁矿工: {current_count:04d}/{mine_capacity:04d}")
-            
-            btn.config(command=build_mine_house)
-            
-        # 为工人房按钮绑定点击事件
-        elif name == "工人房":
-            def build_worker_house():
-                global worker_house_count, resource_labels, population_capacities, populations, buildings
-                # 检查是否拥有建筑社
-                if not industry_built["建筑社"]:
-                    messagebox.showwarning("缺少建筑社", "需要先建造建筑社才能建造工人房")
-                    return
-                # 检查资源是否足够
-                if resources["food"] < 1000:
-                    messagebox.showwarning("食物不足", "需要1000食物来建造工人房")
-                    return
-                if resources["wood"] < 1000:
-                    messagebox.showwarning("木头不足", "需要1000木头来建造工人房")
-                    return
-                if resources["stone"] < 500:
-                    messagebox.showwarning("石头不足", "需要500石头来建造工人房")
-                    return
-                if resources["iron"] < 500:
-                    messagebox.showwarning("铁矿不足", "需要500铁矿来建造工人房")
-                    return
-                
-                # 扣除资源
-                resources["food"] -= 1000
-                resources["wood"] -= 1000
-                resources["stone"] -= 500
-                resources["iron"] -= 500
-                resource_labels["food"].config(text=f"食物: {resources['food']}")
-                resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-                resource_labels["stone"].config(text=f"石头: {resources['stone']}")
-                resource_labels["iron"].config(text=f"铁矿: {resources['iron']}")
-                
-                # 增加工人房数量
-                worker_house_count += 1
-                buildings[4] = ("工人房", worker_house_count)
-                
-                # 更新建筑工容量
-                builder_capacity = worker_house_count * 5 + (1 if industry_built["建筑社"] else 0) * 5
-                population_capacities["建筑工"] = builder_capacity
-                populations[4] = ("建筑工", builder_capacity)
-                
-                # 更新建筑信息显示
-                for widget in building_frame.grid_slaves(row=4, column=0):
-                    if isinstance(widget, tk.Label):
-                        widget.config(text=f"工人房: {worker_house_count:03d}")
-                
-                # 更新建筑工容量显示
-                for widget in population_frame.grid_slaves(row=4, column=0):
-                    if isinstance(widget, tk.Label):
-                        current_text = widget.cget("text")
-                        current_count = int(current_text.split(":")[1].split("/")[0])
-                        widget.config(text=f"建筑工: {current_count:04d}/{builder_capacity:04d}")
-            
-            btn.config(command=build_worker_house)
-
-   
-    
-       
-    # 行业建筑信息框
-    industry_frame = tk.LabelFrame(info_container, text="行业建筑", font=("隶书", 15))     
-    industry_frame.grid(row=3, column=0, columnspan=2, padx=5, pady=10, sticky="ew")               
-    
-    # 行业建筑标签
-    industry_labels = [
-        ("农业社", "gray"),
-        ("林业社", "gray"), 
-        ("采石社", "gray"),
-        ("铁矿社", "gray"),
-        ("建筑社", "gray")
-    ]
-    
-    # 行业建筑状态
-    industry_built = {
-        "农业社": False,
-        "林业社": False,
-        "采石社": False,
-        "铁矿社": False,
-        "建筑社": False
-    }
-
-    def build_agriculture():                   
-        if industry_built["农业社"]:
-            messagebox.showinfo("提示", "已拥有农业社，不能再建造")
-            return
-            
-        if resources["food"] < 120:
-            messagebox.showwarning("食物不足", "需要120食物来建造农业社")
-            return
-            
-        # 扣除食物
-        resources["food"] -= 120
-        resource_labels["food"].config(text=f"食物: {resources['food']}")
-        
-        # 更新状态
-        industry_built["农业社"] = True
-        agriculture_label.config(fg="green")
-        
-        # 增加农民居住上限
-        farmer_capacity = farm_count * 5 + (1 if industry_built["农业社"] else 0) * 10
-        population_capacities["农  民"] = farmer_capacity
-        
-        # 更新农民容量显示，数据格式04d表示4位整数，不足4位前面补0
-        for widget in population_frame.grid_slaves(row=0, column=0):
-            if isinstance(widget, tk.Label):
-                current_text = widget.cget("text")
-                current_count = int(current_text.split(":")[1].split("/")[0])
-                widget.config(text=f"农  民: {current_count:04d}/{farmer_capacity:04d}")
-
-    def build_forestry():
-        if industry_built["林业社"]:
-            messagebox.showinfo("提示", "已拥有林业社，不能再建造")
-            return
-            
-        if resources["food"] < 500:
-            messagebox.showwarning("食物不足", "需要500食物来建造林业社")
-            return
-            
-        # 扣除食物
-        resources["food"] -= 500
-        resource_labels["food"].config(text=f"食物: {resources['food']}")
-        
-        # 更新状态
-        industry_built["林业社"] = True
-        forestry_label.config(fg="green")
-        
-        # 增加伐木工居住上限
-        lumber_capacity = lumber_count * 5 + (1 if industry_built["林业社"] else 0) * 10
-        population_capacities["伐木工"] = lumber_capacity
-        
-        # 更新伐木工容量显示
-        for widget in population_frame.grid_slaves(row=1, column=0):
-            if isinstance(widget, tk.Label):
-                current_text = widget.cget("text")
-                current_count = int(current_text.split(":")[1].split("/")[0])
-                widget.config(text=f"伐木工: {current_count:04d}/{lumber_capacity:04d}")
-
-    def build_quarry_society():
-        if industry_built["采石社"]:
-            messagebox.showinfo("提示", "已拥有采石社，不能再建造")
-            return
-            
-        if resources["food"] < 500:
-            messagebox.showwarning("食物不足", "需要500食物来建造采石社")
-            return
-            
-        if resources["wood"] < 500:
-            messagebox.showwarning("木头不足", "需要500木头来建造采石社")
-            return
-            
-        # 扣除资源
-        resources["food"] -= 500
-        resources["wood"] -= 500
-        resource_labels["food"].config(text=f"食物: {resources['food']}")
-        resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-        
-        # 更新状态
-        industry_built["采石社"] = True
-        quarry_label.config(fg="green")
-        
-        # 增加采石工居住上限
-        quarry_capacity = quarry_count * 5 + (1 if industry_built["采石社"] else 0) * 10
-        population_capacities["采石工"] = quarry_capacity
-        
-        # 更新采石工容量显示
-        for widget in population_frame.grid_slaves(row=2, column=0):
-            if isinstance(widget, tk.Label):
-                current_text = widget.cget("text")
-                current_count = int(current_text.split(":")[1].split("/")[0])
-                widget.config(text=f"采石工: {current_count:04d}/{quarry_capacity:04d}")
-
-    def build_mine_society():
-        if industry_built["铁矿社"]:
-            messagebox.showinfo("提示", "已拥有铁矿社，不能再建造")
-            return
-            
-        if resources["food"] < 500:
-            messagebox.showwarning("食物不足", "需要500食物来建造铁矿社")
-            return
-            
-        if resources["wood"] < 500:
-            messagebox.showwarning("木头不足", "需要500木头来建造铁矿社")
-            return
-            
-        if resources["stone"] < 500:
-            messagebox.showwarning("石头不足", "需要500石头来建造铁矿社")
-            return
-            
-        # 扣除资源
-        resources["food"] -= 500
-        resources["wood"] -= 500
-        resources["stone"] -= 500
-        resource_labels["food"].config(text=f"食物: {resources['food']}")
-        resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-        resource_labels["stone"].config(text=f"石头: {resources['stone']}")
-        
-        # 更新状态
-        industry_built["铁矿社"] = True
-        mine_label.config(fg="green")
-        
-        # 增加铁矿工居住上限
-        mine_capacity = mine_count * 5 + (1 if industry_built["铁矿社"] else 0) * 10
-        population_capacities["铁矿工"] = mine_capacity
-        
-        # 更新铁矿工容量显示
-        for widget in population_frame.grid_slaves(row=3, column=0):
-            if isinstance(widget, tk.Label):
-                current_text = widget.cget("text")
-                current_count = int(current_text.split(":")[1].split("/")[0])
-                widget.config(text=f"铁矿工: {current_count:04d}/{mine_capacity:04d}")
-
-    def build_architectural():
-        if industry_built["建筑社"]:
-            messagebox.showinfo("提示", "已拥有建筑社，不能再建造")
-            return
-        
-        if resources["food"] < 2000:
-            messagebox.showwarning("食物不足", "需要2000食物来建造建筑社")
-            return
-        if resources["wood"] < 2000:
-            messagebox.showwarning("木头不足", "需要2000木头来建造建筑社")
-            return
-        if resources["stone"] < 1000:
-            messagebox.showwarning("石头不足", "需要1000石头来建造建筑社")
-            return
-        if resources["iron"] < 1000:
-            messagebox.showwarning("铁矿不足", "需要1000铁矿来建造建筑社")
-            return
-        
-        # 扣除资源
-        resources["food"] -= 2000
-        resources["wood"] -= 2000
-        resources["stone"] -= 1000
-        resources["iron"] -= 1000
-        resource_labels["food"].config(text=f"食物: {resources['food']}")
-        resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-        resource_labels["stone"].config(text=f"石头: {resources['stone']}")
-        resource_labels["iron"].config(text=f"铁矿: {resources['iron']}")
-
-        # 更新状态
-        industry_built["建筑社"] = True
-        builder_label.config(fg="green")
-
-        # 增加建筑工居住上限
-        builder_capacity = worker_house_count * 5 + (1 if industry_built["建筑社"] else 0) * 5
-        population_capacities["建筑工"] = builder_capacity
-        
-        #更新建筑工容量显示
-        for widget in population_frame.grid_slaves(row=4, column=0):
-            if isinstance(widget, tk.Label):
-                current_text = widget.cget("text")
-                current_count = int(current_text.split(":")[1].split("/")[0])
-                widget.config(text=f"建筑工: {current_count:04d}/{builder_capacity:04d}")
-                      
-    for i, (name, color) in enumerate(industry_labels):
-        label = tk.Label(industry_frame, 
-                        text=name,
-                        font=("隶书", 15),
-                        fg=color)
-        label.grid(row=0, column=i, sticky="w", padx=10, pady=5)
-        
-        # 添加行业建筑提示
-        if name == "农业社":
-            agriculture_label = label
-            Tooltip(label, "需要120食物")
-            label.bind("<Button-1>", lambda e: build_agriculture())
-        elif name == "林业社":
-            forestry_label = label
-            Tooltip(label, "需要500食物")
-            label.bind("<Button-1>", lambda e: build_forestry())
-        elif name == "采石社":
-            quarry_label = label
-            Tooltip(label, "需要500食物 + 500木头")
-            label.bind("<Button-1>", lambda e: build_quarry_society())
-        elif name == "铁矿社":
-            mine_label = label
-            Tooltip(label, "需要500食物 + 500木头 + 500石头")
-            label.bind("<Button-1>", lambda e: build_mine_society())
-        elif name == "建筑社":
-            builder_label = label
-            Tooltip(label, "需要2000食物 + 2000木头 + 1000石头 + 1000铁矿")
-            label.bind("<Button-1>", lambda e: build_architectural())
-    
-    # 在行业建筑框下方添加1行间隙
-    tk.Frame(info_container, height=1).grid(row=4, column=0)
-
-    # 在行业建筑框下方添加研究中心框
-    research_center_frame = tk.LabelFrame(info_container, text="研究中心", font=("隶书", 15))
-    research_center_frame.grid(row=4, column=0, padx=5, pady=5, sticky="ew")
-
-    # 研究中心状态
-    research_center = {
-        "built": False,
-        "building": False,
-        "progress": 0,
-        "required": 500
-    }
-
-    def update_research_progress():
-        if research_center["building"]:
-            # 每秒增加建筑工数量个建筑点
-            research_center["progress"] += workers["builder"]
-            if research_center["progress"] >= research_center["required"]:
-                research_center["built"] = True
-                research_center["building"] = False
-                research_label.config(text="已完成",fg="green")
-                progress_label.config(text=f"进度: {research_center['required']}/{research_center['required']}")
-                messagebox.showinfo("提示", "研究中心建造完成！")
-            else:
-                # 更新进度显示
-                progress_label.config(text=f"进度: {research_center['progress']}/{research_center['required']}")
-                # 继续更新
-                root.after(1000, update_research_progress)
-
-    def build_research_center():
-        if research_center["built"]:
-            messagebox.showinfo("提示", "研究中心已建造完成")
-            return
-        if research_center["building"]:
-            messagebox.showinfo("提示", "研究中心正在建造中")
-            return
-            
-        # 检查资源
-        if resources["food"] < 10000:
-            messagebox.showwarning("食物不足", "需要10000食物")
-            return
-        if resources["wood"] < 10000:
-            messagebox.showwarning("木头不足", "需要10000木头")
-            return
-        if resources["stone"] < 5000:
-            messagebox.showwarning("石头不足", "需要5000石头")
-            return
-        if resources["iron"] < 5000:
-            messagebox.showwarning("铁矿不足", "需要5000铁矿")
-            return
-            
-        # 扣除资源
-        resources["food"] -= 10000
-        resources["wood"] -= 10000
-        resources["stone"] -= 5000
-        resources["iron"] -= 5000
-        resource_labels["food"].config(text=f"食物: {resources['food']}")
-        resource_labels["wood"].config(text=f"木头: {resources['wood']}")
-        resource_labels["stone"].config(text=f"石头: {resources['stone']}")
-        resource_labels["iron"].config(text=f"铁矿: {resources['iron']}")
-        
-        # 开始建造
-        research_center["building"] = True
-        research_label.config(text="建造中.",fg="orange")
-        progress_label.config(text=f"进度: 0/{research_center['required']}")
-        update_research_progress()
-
-    # 研究中心开始建造标签  
-    research_label = tk.Label(research_center_frame, text="开始建造", font=("隶书", 15), fg="gray")
-    research_label.grid(row=0, column=0, sticky="w", padx=10, pady=5)   
-    Tooltip(research_label, "需要10000食物、10000木头、5000石头、5000铁矿")
-    research_label.bind("<Button-1>", lambda e: build_research_center())
-    
-    # 进度标签
-    progress_label = tk.Label(research_center_frame, text="", font=("隶书", 15))
-    progress_label.grid(row=0, column=1, sticky="w", padx=10, pady=5)
-   
-
-
- # 作弊函数
-    def cheat_resources():   
-        for key in resources:
-            resources[key] += 1000
-        for key in resource_labels:
-            resource_labels[key].config(text=f"{resource_display_names[key]}: {resources[key]}")
-            
-    # 在行业建筑框下方添加1行间隙
-    tk.Frame(info_container, height=1).grid(row=2, column=0)
-        
-    # 作弊按钮
-    cheat_button = tk.Button(info_container, 
-                           text="作弊", 
-                           font=("隶书", 15),
-                           bg="red",
-                           fg="white",
-                           command=cheat_resources )
-    cheat_button.grid(row=5, column=0, sticky="sw", padx=5, pady=5)                
-
-    # 添加作弊按钮提示
-    Tooltip(cheat_button, "增加1000所有资源")
-        
-
-def continue_game():    
-    # 继续游戏(暂未实现)
-    print("加载游戏")
-
-
-
-def exit_game():
-    # 退出游戏
-    root.destroy()
-
-# 创建主窗口并设置居中显示
-root = tk.Tk()
-root.title("模拟城堡Demo")
-window_width = 1024
-window_height = 768
-screen_width = root.winfo_screenwidth()
-screen_height = root.winfo_screenheight()
-x = (screen_width // 2) - (window_width // 2)
-y = (screen_height // 2) - (window_height // 2)
-root.geometry(f"{window_width}x{window_height}+{x}+{y}")
-
-button_frame = tk.Frame(root)
-button_frame.pack(expand=True)
-
-start_button = tk.Button(button_frame, text="开始新游戏", command=start_new_game, width=20, 
-                        font=("隶书", 15))
-start_button.pack(pady=10)
-
-continue_button = tk.Button(button_frame, text="加载游戏", command=continue_game, width=20,
-                           font=("隶书", 15))
-continue_button.pack(pady=10)
-
-exit_button = tk.Button(button_frame, text="退出游戏", command=exit_game, width=20,
-                       font=("隶书", 15))
-exit_button.pack(pady=10)
-
-root.mainloop()
+# 模拟城堡游戏 - 资源管理与城市建设模拟器
+# 这是一个使用tkinter构建的城堡模拟游戏，玩家需要管理资源、雇佣工人、建造建筑，
+# 最终目标是建造研究中心完成游戏。
+# 游戏规则和状态在castle_core中，本文件只负责界面显示和把点击转成游戏动作。
+# 使用 --process 参数启动时，游戏模拟在独立进程中运行(见castle_process)；
+# 使用 --canvas 参数启动时，主要面板画在同一个Canvas上(见castle_canvas)；
+# 使用 --tick-rate=N 参数可以让游戏每秒推进N次(如20~60)，资源显示更平滑；
+# 使用 --rules=文件 参数可以加载扩展规则(见castle_core.load_rules)。
+# 游戏过程自动写入存档日志(见castle_save)，默认目录为castle_save，可以用 --save=目录 修改；
+# 主菜单的"加载游戏"从存档日志恢复最后保存的局面。
+# 使用 --metrics=文件 或 --metrics-port=端口 参数可以导出Prometheus格式的指标(见castle_metrics)。
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+from tkinter import messagebox
+
+import castle_canvas
+import castle_core
+import castle_metrics
+import castle_planner
+import castle_process
+import castle_save
+from castle_core import RESOURCE_NAMES, WORKER_RULES, BUILDING_RULES
+
+# 虚拟列表最多显示的行数
+VISIBLE_ROWS = 10
+
+# 行业建筑面板最多显示的标签数
+VISIBLE_SOCIETIES = 6
+
+class Tooltip:
+    # 工具提示类，用于在鼠标悬停时显示提示信息
+    # 属性:
+    #   widget: 绑定提示的控件
+    #   text: 提示文本内容，或返回提示文本的函数(文字随游戏状态变化时使用)
+    #   delay: 显示延迟(毫秒)
+    #   tooltip: 提示窗口对象
+    #   tooltip_id: 定时器ID
+    #   shown: 正在显示的提示，界面刷新时更新其中的动态文字
+
+    shown = set()
+
+    def __init__(self, widget, text, delay=800):
+        # 初始化工具提示
+        # 参数:
+        #   widget: 要绑定提示的控件
+        #   text: 提示文本内容或函数
+        #   delay: 显示延迟(毫秒，默认800)
+        self.widget = widget
+        self.text = text
+        self.delay =delay
+        self.tooltip = None
+        self.tooltip_id = None
+        self.widget.bind("<Enter>", self.schedule_show)
+        self.widget.bind("<Leave>", self.hide)
+
+    def schedule_show(self, event=None):
+        # 安排显示工具提示(鼠标进入时调用)
+        # 参数:
+        #   event: 鼠标事件(可选)
+        self.tooltip_id = self.widget.after(self.delay, self.show)
+
+    def show(self):
+        # 显示工具提示窗口
+        # 计算位置并创建提示窗口
+        x, y, _, _ = self.widget.bbox("insert")
+        x += self.widget.winfo_rootx() + 25
+        y += self.widget.winfo_rooty() + 25
+
+        self.tooltip = tk.Toplevel(self.widget)
+        self.tooltip.wm_overrideredirect(True)
+        self.tooltip.wm_geometry(f"+{x}+{y}")
+
+        self.shown_text = self.current_text()
+        self.label = tk.Label(self.tooltip, text=self.shown_text, background="#ffffe0",
+                              relief="solid", borderwidth=1, font=("隶书", 15))
+        self.label.pack()
+        Tooltip.shown.add(self)
+
+    def current_text(self):
+        # 取当前的提示文本
+        return self.text() if callable(self.text) else self.text
+
+    def refresh(self):
+        # 提示显示期间，文字变化时更新提示窗口
+        text = self.current_text()
+        if text != self.shown_text:
+            self.shown_text = text
+            self.label.config(text=text)
+
+    def hide(self, event=None):
+        # 隐藏工具提示(鼠标离开时调用)
+        # 参数:
+        #   event: 鼠标事件(可选)
+        if self.tooltip:
+            self.tooltip.destroy()
+            self.tooltip = None
+            Tooltip.shown.discard(self)
+        if self.tooltip_id:
+            self.widget.after_cancel(self.tooltip_id)
+            self.tooltip_id = None
+
+
+class VirtualList:
+    # 虚拟滚动列表，用于人口和建筑面板
+    # 只为可见的行创建标签和按钮，滚动时复用这些控件显示其他条目，
+    # 条目再多，控件数量和创建时间也不变
+    # 属性:
+    #   keys: 全部条目的键(与castle_core.panel_texts一致)
+    #   rows: 可见行数
+    #   first: 第一个可见行对应的条目下标
+    #   slots: 每个可见行的(标签, 按钮, 按钮提示)
+    #   button_text: 取按钮文字的函数 button_text(key)，文字在每次界面刷新时更新(见buttons)
+    #   scrollbar: 滚动条(条目不超过可见行数时为None)
+
+    def __init__(self, master, keys, button_text, on_click, on_right_click=None, rows=VISIBLE_ROWS):
+        # 参数:
+        #   master: 父控件
+        #   keys: 全部条目的键
+        #   button_text: 取按钮文字的函数
+        #   on_click: 按钮左键回调 on_click(key)
+        #   on_right_click: 按钮右键回调(可选)
+        #   rows: 最多显示的行数
+        self.keys = keys
+        self.rows = min(rows, len(keys))
+        self.first = 0
+        self.button_text = button_text
+        self.slots = []
+        for i in range(self.rows):
+            label = tk.Label(master, text="", font=("隶书", 15))
+            label.grid(row=i, column=0, sticky="w", padx=5, pady=2)
+
+            btn = tk.Button(master,
+                           width=15,
+                           font=("隶书", 15),
+                           command=lambda i=i: on_click(self.keys[self.first + i]))
+            btn.grid(row=i, column=1, padx=5, pady=2)
+            if on_right_click is not None:
+                btn.bind("<Button-3>", lambda e, i=i: on_right_click(self.keys[self.first + i]))
+
+            for widget in (label, btn):
+                widget.bind("<MouseWheel>", self.wheel)
+                widget.bind("<Button-4>", self.wheel)
+                widget.bind("<Button-5>", self.wheel)
+            self.slots.append((label, btn, Tooltip(btn, "")))
+
+        self.scrollbar = None
+        if len(keys) > self.rows:
+            self.scrollbar = tk.Scrollbar(master, orient="vertical", command=self.yview)
+            self.scrollbar.grid(row=0, column=2, rowspan=self.rows, sticky="ns")
+        self.fill()
+
+    def fill(self):
+        # 把当前窗口内的条目填入可见行的按钮和提示，并更新滚动条
+        for i, (label, btn, tooltip) in enumerate(self.slots):
+            key = self.keys[self.first + i]
+            text = self.button_text(key)
+            btn.config(text=text)
+            panel_cache[btn] = text
+            tooltip.text = lambda key=key: tooltip_text(key)
+        if self.scrollbar is not None:
+            self.scrollbar.set(self.first / len(self.keys), (self.first + self.rows) / len(self.keys))
+
+    def visible(self):
+        # 当前可见的条目 {键: 标签}
+        return {self.keys[self.first + i]: slot[0] for i, slot in enumerate(self.slots)}
+
+    def buttons(self):
+        # 当前可见的条目 {键: 按钮}
+        return {self.keys[self.first + i]: slot[1] for i, slot in enumerate(self.slots)}
+
+    def yview(self, action, amount, unit=None):
+        # 滚动条回调: ("moveto", 比例) 或 ("scroll", 数量, "units"/"pages")
+        if action == "moveto":
+            first = int(float(amount) * len(self.keys))
+        else:
+            first = self.first + int(amount) * (self.rows if unit == "pages" else 1)
+        first = max(0, min(first, len(self.keys) - self.rows))
+        if first != self.first:
+            self.first = first
+            self.fill()
+            render_all()
+
+    def wheel(self, event):
+        # 鼠标滚轮滚动(Linux上为Button-4/Button-5)
+        if self.scrollbar is None:
+            return
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.yview("scroll", -1 if up else 1, "units")
+
+
+class VirtualStrip:
+    # 横向虚拟列表，用于行业建筑面板
+    # 只为可见的几个条目创建标签，左右滚动时复用这些标签显示其他条目，规则中行业建筑再多也不增加控件
+    # 属性:
+    #   keys: 全部条目的键(与castle_core.panel_texts一致)
+    #   columns: 可见的标签数
+    #   first: 第一个可见标签对应的条目下标
+    #   labels: 可见的标签
+    #   scrollbar: 横向滚动条(条目不超过可见数量时为None)
+
+    def __init__(self, master, keys, on_click, on_right_click, columns=VISIBLE_SOCIETIES):
+        # 参数:
+        #   master: 父控件
+        #   keys: 全部条目的键
+        #   on_click: 标签左键回调 on_click(key)
+        #   on_right_click: 标签右键回调 on_right_click(key)
+        #   columns: 最多显示的标签数
+        self.keys = keys
+        self.columns = min(columns, len(keys))
+        self.first = 0
+        self.labels = []
+        for i in range(self.columns):
+            label = tk.Label(master, text=keys[i][1], font=("隶书", 15), fg="gray")
+            label.grid(row=0, column=i, sticky="w", padx=10, pady=5)
+            label.bind("<Button-1>", lambda e, i=i: on_click(self.keys[self.first + i]))
+            label.bind("<Button-3>", lambda e, i=i: on_right_click(self.keys[self.first + i]))
+            label.bind("<MouseWheel>", self.wheel)
+            label.bind("<Button-4>", self.wheel)
+            label.bind("<Button-5>", self.wheel)
+            Tooltip(label, lambda i=i: tooltip_text(self.keys[self.first + i]))
+            self.labels.append(label)
+
+        self.scrollbar = None
+        if len(keys) > self.columns:
+            self.scrollbar = tk.Scrollbar(master, orient="horizontal", command=self.xview)
+            self.scrollbar.grid(row=1, column=0, columnspan=self.columns, sticky="ew")
+            self.scrollbar.set(0, self.columns / len(keys))
+
+    def visible(self):
+        # 当前可见的条目 {键: 标签}
+        return {self.keys[self.first + i]: label for i, label in enumerate(self.labels)}
+
+    def xview(self, action, amount, unit=None):
+        # 滚动条回调: ("moveto", 比例) 或 ("scroll", 数量, "units"/"pages")
+        if action == "moveto":
+            first = int(float(amount) * len(self.keys))
+        else:
+            first = self.first + int(amount) * (self.columns if unit == "pages" else 1)
+        first = max(0, min(first, len(self.keys) - self.columns))
+        if first != self.first:
+            self.first = first
+            self.scrollbar.set(first / len(self.keys), (first + self.columns) / len(self.keys))
+            render_all()
+
+    def wheel(self, event):
+        # 鼠标滚轮左右滚动(Linux上为Button-4/Button-5)
+        if self.scrollbar is None:
+            return
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.xview("scroll", -1 if up else 1, "units")
+
+
+# 全局游戏状态 - 资源、工人、建筑、行业建筑和研究中心
+game_state = castle_core.new_game()
+
+# 全局资源变量 - 存储游戏中的四种资源数量
+resources = game_state["resources"]
+
+# 全局工人数量 - 存储五种工人的数量
+workers = game_state["workers"]
+
+# 撤销历史与分支
+history = castle_core.History(limit=100)
+branch_names = []
+
+# 独立模拟进程(使用 --process 启动时创建)，为None时在界面进程内模拟
+simulation = None
+
+# 存档日志目录与写入器(进入游戏后创建)
+save_path = "castle_save"
+journal = None
+
+# 使用独立模拟进程时，是否有已发出的动作还没有写入存档
+save_pending = False
+
+# 指标导出器与本局的指标(使用 --metrics 或 --metrics-port 启动时创建)
+metrics = None
+colony_metrics = None
+
+# 后台规划器，结果通过after_idle交回Tk线程显示
+planner = castle_planner.Planner(
+    deliver=lambda request_id, strategy, eta: root.after_idle(show_plan_result, request_id, strategy, eta))
+
+# 建造队列最多显示的项目数
+QUEUE_PREVIEW_ROWS = 8
+
+# 各种按钮的负担时间(缺少的资源和还需的秒数)，资源或工人变化时才重新计算
+afford_cache = castle_core.AffordCache()
+
+# 面板控件 - 键与castle_core.panel_texts一致，panel_cache记录每个控件上一次显示的(文字, 颜色)
+panel_widgets = {}
+panel_cache = {}
+
+# 单画布渲染器(使用 --canvas 启动时创建)
+canvas_renderer = None
+
+def show_error(error):
+    # 显示动作失败的提示
+    # 参数:
+    #   error: (标题, 提示内容)
+    title, message = error
+    if title == "提示":
+        messagebox.showinfo(title, message)
+    else:
+        messagebox.showwarning(title, message)
+
+def perform(command, *args):
+    # 执行一条玩家命令，失败时弹出提示
+    # 使用独立模拟进程时只把命令发过去，结果由poll_simulation显示
+    # 参数:
+    #   command: 命令名(见castle_core.perform)
+    #   args: 命令参数
+    global save_pending
+    if simulation is not None:
+        simulation.send(command, *args)
+        if colony_metrics is not None:
+            colony_metrics.action()
+        # 动作的结果随下一次发布的状态到达，届时立即写入存档
+        save_pending = True
+        return
+    error = castle_core.perform(game_state, history, command, *args)
+    if colony_metrics is not None:
+        colony_metrics.action(error)
+    if error:
+        show_error(error)
+        return
+    journal.save(game_state, force=True)
+    render_all()
+
+def tooltip_text(key):
+    # 取得面板元素的提示文字: 花费，以及按当前产量还缺多少资源、多少秒后足够；
+    # 已建成或正在建造的行业建筑和研究中心只显示状态
+    # 参数:
+    #   key: (面板, 键)，与castle_core.panel_texts一致
+    status = castle_core.action_status(game_state, key)
+    if status is not None:
+        return status
+    cost = castle_core.cost_text(castle_core.action_cost(key))
+    return f"{cost}  {castle_core.afford_text(*afford_cache.get(game_state, key))}"
+
+def button_text(key):
+    # 雇佣和建造按钮的文字，暂时负担不起时附上还需的秒数
+    # 参数:
+    #   key: ("worker", 工人) 或 ("building", 建筑)
+    kind, name = key
+    if kind == "worker":
+        text = f"雇佣{WORKER_RULES[name]['name']}"
+    else:
+        text = f"建造{BUILDING_RULES[name]['name']}"
+    shortfall, seconds = afford_cache.get(game_state, key)
+    if not shortfall:
+        return text
+    if seconds is None:
+        return f"{text}(无产出)"
+    return f"{text}({seconds}秒)"
+
+def render_all():
+    # 根据游戏状态一次性刷新所有界面元素，文字和颜色没有变化的控件不再重复配置
+    # 状态变化和滚动后都会调用本函数；存档日志由动作和推进各自写入(见perform、update_resources)
+    afford_cache.update(game_state)
+    if canvas_renderer is not None:
+        # 人口、建筑和行业建筑面板只生成显示出来的条目的文字
+        canvas_renderer.render(castle_core.panel_texts(game_state, canvas_renderer.items))
+        canvas_renderer.render_buttons()
+    else:
+        # 人口、建筑和行业建筑面板只生成可见条目的文字
+        widgets = dict(panel_widgets)
+        widgets.update(worker_list.visible())
+        widgets.update(building_list.visible())
+        widgets.update(society_strip.visible())
+        for key, (text, color) in castle_core.panel_texts(game_state, widgets).items():
+            widget = widgets[key]
+            if panel_cache.get(widget) == (text, color):
+                continue
+            panel_cache[widget] = (text, color)
+            if color is None:
+                widget.config(text=text)
+            else:
+                widget.config(text=text, fg=color)
+
+        # 可见行的按钮文字随负担时间变化
+        buttons = worker_list.buttons()
+        buttons.update(building_list.buttons())
+        for key, btn in buttons.items():
+            text = button_text(key)
+            if panel_cache.get(btn) != text:
+                panel_cache[btn] = text
+                btn.config(text=text)
+
+    # 正在显示的提示随负担时间变化
+    for tooltip in list(Tooltip.shown):
+        tooltip.refresh()
+
+    # 建造队列只用一个标签显示前几个项目，队列再长也不增加控件
+    lines = castle_core.queue_lines(game_state, QUEUE_PREVIEW_ROWS)
+    queue_label.config(text="\n".join(lines) if lines else "队列为空")
+
+def update_resources():
+    # 更新资源数量(每秒调用tick_rate次)
+    # 按真实时间计算应推进的次数，after回调迟到时一次补齐，游戏时间不会因界面繁忙而变慢
+    global ticks_done
+    rate = game_state["tick_rate"]
+    elapsed = time.monotonic() - clock_start
+    due = int(elapsed * rate) - ticks_done
+    if due > 0:
+        if colony_metrics is not None:
+            colony_metrics.lag = elapsed - (ticks_done + 1) / rate
+            colony_metrics.ticks += due
+        ticks_done += due
+        events = castle_core.tick(game_state, due)
+        journal.save(game_state)
+        render_all()
+        if colony_metrics is not None and metrics.due():
+            colony_metrics.publish(game_state)
+        if "research_done" in events:
+            messagebox.showinfo("提示", "研究中心建造完成！")
+
+    # 设置下一次更新
+    root.after(max(1, 1000 // rate), update_resources)
+
+def poll_simulation():
+    # 读取独立模拟进程发布的最新状态和回复(每poll_interval毫秒调用一次)
+    # 状态没有变化时不重绘
+    global save_pending
+    # 先判断进程是否还在运行: 已经退出的进程的回复(包括出错原因)此时都已经可以读到
+    alive = simulation.alive()
+    crash_reason = None
+    state = simulation.read_state()
+    if state is not None:
+        castle_core.restore(game_state, state)
+        journal.save(game_state, force=save_pending)
+        save_pending = False
+        render_all()
+        if colony_metrics is not None:
+            colony_metrics.ticks = game_state["time"] * game_state["tick_rate"] + game_state["subtick"]
+            colony_metrics.lag = simulation.lag
+            if metrics.due():
+                colony_metrics.publish(game_state)
+    for kind, value in simulation.poll_replies():
+        if kind == "error":
+            if colony_metrics is not None:
+                colony_metrics.failure(value)
+            show_error(value)
+        elif kind == "crash":
+            crash_reason = value
+        elif value == "research_done":
+            messagebox.showinfo("提示", "研究中心建造完成！")
+
+    if not alive:
+        # 模拟进程出错退出(如状态超出共享内存)后不再轮询，界面停在最后发布的状态
+        messagebox.showwarning("警告", f"模拟进程已停止，游戏无法继续: {crash_reason or '未知原因'}\n"
+                                      "已保存的进度可以通过加载游戏恢复")
+        return
+    root.after(poll_interval, poll_simulation)
+
+def save_branch():
+    # 把当前局面保存为一个新分支，之后可以随时切换回来
+    name = f"分支{len(branch_names) + 1}"
+    perform("save_branch", name)
+    branch_names.append(name)
+    branch_box.config(values=branch_names)
+    branch_box.set(name)
+
+def switch_branch(event=None):
+    # 切换到下拉框中选择的分支
+    perform("switch_branch", branch_box.get())
+
+def request_plan():
+    # 对当前局面发起规划请求，旧的规划会被取消
+    goal = goal_box.get()
+    plan_results.clear()
+    plan_label.config(text=f"正在计算{goal}的建造时间...")
+    planner.request(castle_core.snapshot(game_state), goal)
+
+def show_plan_result(request_id, strategy, eta):
+    # 显示一条规划结果(在Tk线程中调用)，过期请求的结果直接丢弃
+    if request_id != planner.request_id:
+        return
+    if eta < 0:
+        plan_results[strategy] = f"{strategy}: {castle_planner.HORIZON // 3600}小时内无法达成"
+    else:
+        plan_results[strategy] = f"{strategy}: {eta // 60}分{eta % 60:02d}秒"
+    plan_label.config(text="\n".join(plan_results.values()))
+
+def build_widget_panels(info_container):
+    # 用独立的Label/Button控件创建资源、人口、建筑、行业建筑和研究中心面板
+    # 参数:
+    #   info_container: 信息显示容器
+    # 资源信息框
+    resource_frame = tk.LabelFrame(info_container, text="资源信息", font=("隶书", 15))
+    resource_frame.grid(row=0, column=0, padx=5, sticky="ew")
+
+    for key, name in RESOURCE_NAMES.items():
+        panel_widgets[("resource", key)] = tk.Label(resource_frame, text=f"{name}: 0", font=("隶书", 15))
+        panel_widgets[("resource", key)].pack(anchor="w")
+
+    # 第二行容器
+    row2_container = tk.Frame(info_container)
+    row2_container.grid(row=1, column=0, sticky="ew")
+
+    # 配置第二行列权重
+    row2_container.grid_columnconfigure(0, weight=1,uniform="group1")
+    row2_container.grid_columnconfigure(1, weight=1,uniform="group1")
+
+    # 人口信息框
+    population_frame = tk.LabelFrame(row2_container, text="人口信息", font=("隶书", 15))
+    population_frame.grid(row=0, column=0, padx=5, sticky="nsew")
+
+    # 人口行只为可见的行创建控件，规则中有几百种工人时也一样
+    global worker_list, building_list
+    worker_list = VirtualList(population_frame, [("worker", worker) for worker in WORKER_RULES],
+                              button_text, lambda key: perform("hire", key[1]))
+
+    # 建筑信息框
+    building_frame = tk.LabelFrame(row2_container, text="建筑信息", font=("隶书", 15))
+    building_frame.grid(row=0, column=1, padx=5, sticky="nsew")
+
+    building_list = VirtualList(building_frame, [("building", building) for building in BUILDING_RULES],
+                                button_text, lambda key: perform("build_house", key[1]),
+                                lambda key: perform("build_house", key[1], 1, castle_core.PRIORITY_URGENT))
+
+    # 行业建筑信息框
+    industry_frame = tk.LabelFrame(info_container, text="行业建筑", font=("隶书", 15))
+    industry_frame.grid(row=3, column=0, columnspan=2, padx=5, pady=10, sticky="ew")
+
+    # 行业建筑标签，点击建造；与人口和建筑面板一样只为可见的几个条目创建标签
+    global society_strip
+    society_strip = VirtualStrip(industry_frame, [("society", society) for society in game_state["industry"]],
+                                 lambda key: perform("build_society", key[1]),
+                                 lambda key: perform("build_society", key[1], castle_core.PRIORITY_URGENT))
+
+    # 在行业建筑框下方添加1行间隙
+    tk.Frame(info_container, height=1).grid(row=4, column=0)
+
+    # 在行业建筑框下方添加研究中心框
+    research_center_frame = tk.LabelFrame(info_container, text="研究中心", font=("隶书", 15))
+    research_center_frame.grid(row=4, column=0, padx=5, pady=5, sticky="ew")
+
+    # 研究中心开始建造标签
+    research_label = tk.Label(research_center_frame, text="开始建造", font=("隶书", 15), fg="gray")
+    research_label.grid(row=0, column=0, sticky="w", padx=10, pady=5)
+    panel_widgets[("research", "status")] = research_label
+    Tooltip(research_label, lambda: tooltip_text(("research", "status")))
+    research_label.bind("<Button-1>", lambda e: perform("build_research"))
+    research_label.bind("<Button-3>", lambda e: perform("build_research", castle_core.PRIORITY_URGENT))
+
+    # 进度标签
+    progress_label = tk.Label(research_center_frame, text="", font=("隶书", 15))
+    progress_label.grid(row=0, column=1, sticky="w", padx=10, pady=5)
+    panel_widgets[("research", "progress")] = progress_label
+
+def start_new_game():
+    # 开始新游戏
+    # 初始化游戏界面，创建资源显示、工人管理、建筑管理等UI元素
+    # 隐藏主菜单
+    button_frame.pack_forget()
+
+    # 创建游戏主界面
+    game_frame = tk.Frame(root)
+    game_frame.pack(expand=True, fill="both", padx=20, pady=20)
+
+    # 创建信息显示容器
+    info_container = tk.Frame(game_frame)
+    info_container.pack(fill="x", pady=5)
+
+    # 配置列权重
+    info_container.grid_columnconfigure(0, weight=1)
+
+    global branch_box, goal_box, plan_label, plan_results, queue_label, canvas_renderer
+    if "--canvas" in sys.argv:
+        # 单画布渲染: 五个面板画在同一个Canvas上
+        canvas_renderer = castle_canvas.CanvasRenderer(info_container, perform, tooltip_text, button_text,
+                                                       render_all)
+        canvas_renderer.canvas.grid(row=0, column=0, rowspan=5, padx=5, sticky="ew")
+    else:
+        build_widget_panels(info_container)
+
+    # 在行业建筑框下方添加1行间隙
+    tk.Frame(info_container, height=1).grid(row=2, column=0)
+
+    # 操作按钮容器: 作弊、撤销和分支
+    control_frame = tk.Frame(info_container)
+    control_frame.grid(row=5, column=0, sticky="sw", padx=5, pady=5)
+
+    # 作弊按钮
+    cheat_button = tk.Button(control_frame,
+                           text="作弊",
+                           font=("隶书", 15),
+                           bg="red",
+                           fg="white",
+                           command=lambda: perform("cheat"))
+    cheat_button.pack(side="left")
+
+    # 添加作弊按钮提示
+    Tooltip(cheat_button, "增加1000所有资源")
+
+    # 撤销按钮
+    undo_button = tk.Button(control_frame, text="撤销", font=("隶书", 15), command=lambda: perform("undo"))
+    undo_button.pack(side="left", padx=5)
+    Tooltip(undo_button, f"撤销上一次雇佣或建造并退还花费，已建成的项目不能撤销(最多保留{history.snapshots.maxlen}步)")
+
+    # 分支按钮与分支选择
+    branch_button = tk.Button(control_frame, text="保存分支", font=("隶书", 15), command=save_branch)
+    branch_button.pack(side="left", padx=5)
+    Tooltip(branch_button, "保存当前局面，稍后可以切换回来尝试不同的建造顺序")
+
+    branch_box = ttk.Combobox(control_frame, state="readonly", width=10, font=("隶书", 15))
+    branch_box.pack(side="left", padx=5)
+    branch_box.bind("<<ComboboxSelected>>", switch_branch)
+
+    # 建造队列框: 建筑工每秒的建筑点按优先级分配给队列中的项目，右键点击建造为优先建造
+    queue_frame = tk.LabelFrame(info_container, text="建造队列(右键优先建造)", font=("隶书", 15))
+    queue_frame.grid(row=7, column=0, padx=5, pady=5, sticky="ew")
+
+    queue_label = tk.Label(queue_frame, text="队列为空", font=("隶书", 15), justify="left")
+    queue_label.grid(row=0, column=0, sticky="w", padx=10, pady=5)
+
+    # 规划框: 选择目标，计算各种雇佣策略下负担得起的时间
+    plan_frame = tk.LabelFrame(info_container, text="规划", font=("隶书", 15))
+    plan_frame.grid(row=6, column=0, padx=5, pady=5, sticky="ew")
+
+    goal_box = ttk.Combobox(plan_frame, state="readonly", width=10, font=("隶书", 15),
+                            values=list(castle_planner.goals()))
+    goal_box.set("研究中心")
+    goal_box.grid(row=0, column=0, sticky="w", padx=10, pady=5)
+
+    plan_button = tk.Button(plan_frame, text="计算", font=("隶书", 15), command=request_plan)
+    plan_button.grid(row=0, column=1, sticky="w", padx=5, pady=5)
+    Tooltip(plan_button, "从当前局面出发快进模拟，估算各种雇佣策略下多久能负担得起目标")
+
+    plan_results = {}
+    plan_label = tk.Label(plan_frame, text="", font=("隶书", 15), justify="left")
+    plan_label.grid(row=1, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+
+    # 启动资源更新循环
+    global clock_start, ticks_done, journal
+    journal = castle_save.Journal(save_path)
+    journal.save(game_state)
+    render_all()
+    if simulation is not None:
+        simulation.start()
+        root.after(poll_interval, poll_simulation)
+    else:
+        clock_start = time.monotonic()
+        ticks_done = 0
+        root.after(1000 // game_state["tick_rate"], update_resources)
+
+
+def continue_game():
+    # 从存档日志恢复最后保存的局面并继续游戏
+    global resources, workers
+    state = castle_save.recover(save_path)
+    if state is None:
+        messagebox.showwarning("警告", "没有找到存档")
+        return
+    # 存档时的推进频率可能与本次启动不同，余量按当前频率换算
+    castle_core.set_tick_rate(state, game_state["tick_rate"])
+    game_state.clear()
+    game_state.update(state)
+    resources = game_state["resources"]
+    workers = game_state["workers"]
+    if simulation is not None:
+        simulation.send("restore", castle_core.snapshot(game_state))
+    start_new_game()
+
+
+
+def exit_game():
+    # 退出游戏
+    if simulation is not None:
+        simulation.stop()
+    if journal is not None:
+        # 最后一次记录之后不满一秒的推进也写入存档
+        journal.save(game_state, force=True)
+        journal.close()
+    if metrics is not None:
+        metrics.stop()
+    root.destroy()
+
+def main():
+    # 创建主窗口并设置居中显示
+    global root, button_frame, simulation, poll_interval, resources, workers, save_path
+    global metrics, colony_metrics
+    rules_path = None
+    metrics_path = None
+    metrics_port = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--tick-rate="):
+            castle_core.set_tick_rate(game_state, max(1, int(arg.split("=", 1)[1])))
+        elif arg.startswith("--rules="):
+            rules_path = arg.split("=", 1)[1]
+        elif arg.startswith("--save="):
+            save_path = arg.split("=", 1)[1]
+        elif arg.startswith("--metrics="):
+            metrics_path = arg.split("=", 1)[1]
+        elif arg.startswith("--metrics-port="):
+            metrics_port = int(arg.split("=", 1)[1])
+    if rules_path is not None:
+        # 加载扩展规则后按新规则重新创建游戏状态
+        castle_core.load_rules(rules_path)
+        tick_rate = game_state["tick_rate"]
+        game_state.clear()
+        game_state.update(castle_core.new_game(tick_rate))
+        resources = game_state["resources"]
+        workers = game_state["workers"]
+    if metrics_path is not None or metrics_port is not None:
+        metrics = castle_metrics.Metrics(metrics_path, metrics_port)
+        colony_metrics = metrics.colony("local")
+        metrics.start()
+    if "--process" in sys.argv:
+        simulation = castle_process.SimulationProcess(game_state["tick_rate"], rules_path)
+        poll_interval = min(50, 1000 // game_state["tick_rate"])
+
+    root = tk.Tk()
+    root.title("模拟城堡Demo")
+    root.protocol("WM_DELETE_WINDOW", exit_game)
+    window_width = 1024
+    window_height = 768
+    screen_width = root.winfo_screenwidth()
+    screen_height = root.winfo_screenheight()
+    x = (screen_width // 2) - (window_width // 2)
+    y = (screen_height // 2) - (window_height // 2)
+    root.geometry(f"{window_width}x{window_height}+{x}+{y}")
+
+    button_frame = tk.Frame(root)
+    button_frame.pack(expand=True)
+
+    start_button = tk.Button(button_frame, text="开始新游戏", command=start_new_game, width=20,
+                            font=("隶书", 15))
+    start_button.pack(pady=10)
+
+    continue_button = tk.Button(button_frame, text="加载游戏", command=continue_game, width=20,
+                               font=("隶书", 15))
+    continue_button.pack(pady=10)
+
+    exit_button = tk.Button(button_frame, text="退出游戏", command=exit_game, width=20,
+                           font=("隶书", 15))
+    exit_button.pack(pady=10)
+
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
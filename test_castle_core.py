@@ -0,0 +1,87 @@
+# castle_core的撤销与分支测试 - 撤销退还动作的花费并取消效果，游戏时间只向前走
+#
+# 用法: python -m pytest test_castle_core.py  或  python -m unittest test_castle_core
+import unittest
+
+import castle_core
+
+
+def rich_game():
+    # 资源充足、已有农业社的新游戏
+    state = castle_core.new_game(1)
+    for key in state["resources"]:
+        state["resources"][key] = 100000
+    state["industry"]["农业社"] = True
+    return state
+
+
+class UndoTest(unittest.TestCase):
+    def setUp(self):
+        self.state = rich_game()
+        self.history = castle_core.History()
+
+    def perform(self, command, *args):
+        return castle_core.perform(self.state, self.history, command, *args)
+
+    def test_undo_hire_refunds_and_keeps_production(self):
+        self.assertIsNone(self.perform("hire", "farmer", 3))
+        castle_core.advance(self.state, 100)
+        food = self.state["resources"]["food"]
+        self.assertIsNone(self.perform("undo"))
+        self.assertEqual(self.state["workers"]["farmer"], 0)
+        # 退还3个农民的花费，雇佣后100秒的产出保留，时间不倒退
+        cost = castle_core.WORKER_RULES["farmer"]["cost"]["food"]
+        self.assertEqual(self.state["resources"]["food"], food + 3 * cost)
+        self.assertEqual(self.state["time"], 100)
+
+    def test_undo_cancels_queued_build(self):
+        before = castle_core.snapshot(self.state)
+        self.assertIsNone(self.perform("build_house", "farm", 2))
+        self.assertIsNone(self.perform("build_research"))
+        castle_core.advance(self.state, 3)
+        self.assertIsNone(self.perform("undo"))
+        self.assertIsNone(self.perform("undo"))
+        self.assertEqual(self.state["queue"], [])
+        self.assertEqual(self.state["pending"], {})
+        self.assertEqual(self.state["queue_progress"], {})
+        self.assertFalse(self.state["research"]["building"])
+        self.assertEqual(self.state["resources"], before["resources"])
+        self.assertEqual(self.state["time"], 3)
+
+    def test_undo_keeps_other_queue_entries(self):
+        self.assertIsNone(self.perform("build_house", "farm", 1))
+        self.assertIsNone(self.perform("build_house", "farm", 4, castle_core.PRIORITY_URGENT))
+        self.assertIsNone(self.perform("build_society", "林业社"))
+        self.history.snapshots.rotate(-1)
+        # 撤销最早的一单(轮换后位于末尾)，其余两单保持原有顺序
+        self.assertIsNone(self.perform("undo"))
+        self.assertEqual([entry[3:5] for entry in sorted(self.state["queue"])], [("farm", 4), ("林业社", 1)])
+        self.assertEqual(self.state["pending"], {"farm": 4, "林业社": 1})
+
+    def test_completed_build_cannot_be_undone(self):
+        self.assertIsNone(self.perform("build_house", "farm", 1))
+        castle_core.advance(self.state, 60)
+        self.assertEqual(self.state["buildings"]["farm"], 1)
+        resources = dict(self.state["resources"])
+        self.assertIsNotNone(self.perform("undo"))
+        self.assertEqual(self.state["buildings"]["farm"], 1)
+        self.assertEqual(self.state["resources"], resources)
+        self.assertEqual(len(self.history.snapshots), 0)
+
+    def test_nothing_to_undo(self):
+        self.assertEqual(self.perform("undo"), ("提示", "没有可以撤销的操作"))
+
+    def test_switch_branch_keeps_clock(self):
+        self.assertIsNone(self.perform("save_branch", "a"))
+        self.assertIsNone(self.perform("hire", "farmer", 5))
+        castle_core.advance(self.state, 50)
+        self.assertIsNone(self.perform("switch_branch", "a"))
+        self.assertEqual(self.state["workers"]["farmer"], 0)
+        self.assertEqual(self.state["time"], 50)
+        self.assertIsNone(self.perform("undo"))
+        self.assertEqual(self.state["workers"]["farmer"], 5)
+        self.assertEqual(self.state["time"], 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
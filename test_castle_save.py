@@ -0,0 +1,137 @@
+# castle_save的测试 - 变长整数与zigzag编码、记录校验、按时间恢复和损坏存档的恢复
+#
+# 用法: python -m pytest test_castle_save.py  或  python -m unittest test_castle_save
+import os
+import shutil
+import tempfile
+import unittest
+
+import castle_core
+import castle_save
+
+
+def play(path, seconds, checkpoint_seconds=castle_save.CHECKPOINT_SECONDS):
+    # 雇佣几个农民后推进seconds秒，每秒记录一次存档
+    # 返回:
+    #   {游戏时间: 该时间点的状态快照}
+    state = castle_core.new_game(1)
+    state["industry"]["农业社"] = True
+    castle_core.hire(state, "farmer", 3)
+    journal = castle_save.Journal(path, checkpoint_seconds=checkpoint_seconds)
+    journal.save(state)
+    states = {0: castle_core.snapshot(state)}
+    for second in range(1, seconds + 1):
+        castle_core.advance(state, 1)
+        journal.save(state)
+        states[second] = castle_core.snapshot(state)
+    journal.close()
+    return states
+
+
+class CodecTest(unittest.TestCase):
+    def test_varint_round_trip(self):
+        for value in [0, 1, 0x7f, 0x80, 300, 1 << 21, (1 << 63) + 5]:
+            out = bytearray()
+            castle_save.write_varint(out, value)
+            self.assertEqual(castle_save.read_varint(bytes(out) + b"\xff", 0), (value, len(out)))
+
+    def test_truncated_varint(self):
+        with self.assertRaises(IndexError):
+            castle_save.read_varint(b"\x80\x80", 0)
+
+    def test_delta_round_trip_with_negative_changes(self):
+        old = castle_core.new_game(1)
+        old["resources"]["food"] = 500
+        new = castle_core.fork(old)
+        new["resources"]["food"] = 499
+        new["resources"]["wood"] = 1000
+        new["workers"]["farmer"] = 2
+        new["pending"]["farm"] = 1
+        new["time"] = 7
+        payload = castle_save.DeltaCodec(old).encode(old, new)
+        # 只有数值变化时，-1按zigzag编码只占一个字节
+        small = castle_core.fork(old)
+        small["resources"]["food"] -= 1
+        self.assertEqual(len(castle_save.DeltaCodec(old).encode(old, small)), 3)
+
+        state = castle_core.fork(old)
+        castle_save.DeltaCodec(old).apply(state, payload)
+        self.assertEqual(state, new)
+        self.assertIsNone(castle_save.DeltaCodec(old).encode(old, castle_core.fork(old)))
+
+
+class FramingTest(unittest.TestCase):
+    def test_records_stop_at_bad_crc_or_truncation(self):
+        data = castle_save.frame(1, b"first") + castle_save.frame(2, b"second")
+        self.assertEqual(list(castle_save.records(data)), [(1, b"first"), (2, b"second")])
+        self.assertEqual(list(castle_save.records(data[:-1])), [(1, b"first")])
+        damaged = bytearray(data)
+        damaged[-6] ^= 1
+        self.assertEqual(list(castle_save.records(bytes(damaged))), [(1, b"first")])
+        self.assertEqual(list(castle_save.records(b"\x01")), [])
+
+
+class RecoverTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def segment(self, number):
+        return os.path.join(self.path, f"{number:06d}.pack")
+
+    def test_recover_latest_and_until(self):
+        states = play(self.path, 45, checkpoint_seconds=20)
+        self.assertEqual(len(castle_save.segment_files(self.path)), 3)
+        self.assertEqual(castle_save.recover(self.path), states[45])
+        for until in (0, 5, 20, 33, 45):
+            self.assertEqual(castle_save.recover(self.path, until), states[until])
+
+    def test_truncated_last_record(self):
+        states = play(self.path, 10)
+        # 模拟崩溃时写了一半的记录: 把压缩段还原成未压缩段并截掉最后几个字节
+        data = castle_save.read_segment(self.segment(1))
+        os.remove(self.segment(1))
+        with open(os.path.join(self.path, "000001.log"), "wb") as file:
+            file.write(data[:-3])
+        self.assertEqual(castle_save.recover(self.path), states[9])
+
+    def test_corrupt_segment_falls_back_to_previous(self):
+        states = play(self.path, 30, checkpoint_seconds=10)
+        with open(self.segment(4), "wb") as file:
+            file.write(b"not a zlib stream")
+        self.assertEqual(castle_save.recover(self.path), states[29])
+        with open(self.segment(3), "rb") as file:
+            data = file.read()
+        with open(self.segment(3), "wb") as file:
+            file.write(data[:len(data) // 2])
+        self.assertEqual(castle_save.recover(self.path), states[19])
+
+    def test_recover_until_after_undo(self):
+        # 撤销不会让游戏时间倒退，按时间恢复得到的是当时实际的局面
+        state = castle_core.new_game(1)
+        state["industry"]["农业社"] = True
+        history = castle_core.History()
+        journal = castle_save.Journal(self.path)
+        castle_core.perform(state, history, "hire", "farmer", 2)
+        journal.save(state, force=True)
+        at_50 = None
+        for second in range(1, 301):
+            castle_core.advance(state, 1)
+            journal.save(state)
+            if second == 50:
+                at_50 = castle_core.snapshot(state)
+        castle_core.perform(state, history, "undo")
+        journal.save(state, force=True)
+        journal.close()
+        self.assertEqual(castle_save.recover(self.path, 50), at_50)
+        self.assertEqual(castle_save.recover(self.path)["workers"]["farmer"], 0)
+
+    def test_missing_or_empty_save(self):
+        self.assertIsNone(castle_save.recover(os.path.join(self.path, "missing")))
+        self.assertIsNone(castle_save.recover(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+# castle_server的本地测试 - 在127.0.0.1上启动服务器，通过真实的TCP连接发送请求
+# 推进循环在测试开始时停掉，改由测试调用server.advance推进，结果与时间无关
+#
+# 用法: python -m pytest test_castle_server.py  或  python -m unittest test_castle_server
+import asyncio
+import json
+import unittest
+
+import castle_core
+import castle_server
+
+
+class Client:
+    # 测试用的连接: 发送请求并读取回复，期间收到的订阅推送存入events
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.events = []
+
+    async def request(self, **message):
+        # 发送一条请求，返回它的回复
+        self.writer.write((json.dumps(message) + "\n").encode("utf-8"))
+        await self.writer.drain()
+        while True:
+            reply = json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+            if "event" not in reply:
+                return reply
+            self.events.append(reply)
+
+    async def sync(self):
+        # 发送一条空请求，确保此前服务器推送的内容都已读入events
+        await self.request(op="list")
+
+    def view(self, state):
+        # 从订阅时的完整状态开始应用收到的所有变化，得到该订阅者看到的状态
+        for event in self.events:
+            castle_core.apply_diff(state, event["delta"])
+        self.events = []
+        return state
+
+
+def normalized(state):
+    # 服务器状态经过JSON编码后的样子(元组变列表，整数键变字符串)，用于和订阅者看到的状态比较
+    return json.loads(json.dumps(state))
+
+
+class ColonyServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = castle_server.ColonyServer(tick_rate=1)
+        port = await self.server.start(port=0)
+        self.server.ticker.cancel()
+        self.clients = []
+        self.port = port
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            client.writer.close()
+        await self.server.stop()
+
+    async def connect(self):
+        client = Client(*await asyncio.open_connection("127.0.0.1", self.port))
+        self.clients.append(client)
+        return client
+
+    async def test_create_command_and_subscribe_delta(self):
+        client = await self.connect()
+        reply = await client.request(op="create")
+        self.assertTrue(reply["ok"])
+        colony = reply["colony"]
+        self.assertEqual((await client.request(op="list"))["colonies"], [colony])
+
+        subscribed = await client.request(op="subscribe", colony=colony)
+        food = subscribed["state"]["resources"]["food"]
+        self.assertEqual(await client.request(op="command", colony=colony, command="cheat"), {"ok": True})
+        self.server.advance(1)
+        await client.sync()
+        self.assertEqual(len(client.events), 1)
+        self.assertEqual(client.events[0]["delta"]["resources"]["food"], food + 1000)
+        self.assertEqual(client.events[0]["delta"]["time"], 1)
+
+        self.assertEqual(await client.request(op="unsubscribe", colony=colony), {"ok": True})
+        self.server.advance(1)
+        await client.sync()
+        self.assertEqual(client.events[1:], [])
+
+    async def test_subscribers_stay_consistent(self):
+        first = await self.connect()
+        second = await self.connect()
+        colony = (await first.request(op="create"))["colony"]
+        first_state = (await first.request(op="subscribe", colony=colony))["state"]
+        # 两次推进之间的变化不能因为新的订阅而从第一个订阅者那里丢失
+        await first.request(op="command", colony=colony, command="cheat")
+        second_state = (await second.request(op="subscribe", colony=colony))["state"]
+        for _ in range(3):
+            self.server.advance(1)
+            await first.request(op="command", colony=colony, command="hire", args=["farmer"])
+        await first.sync()
+        await second.sync()
+
+        expected = normalized(self.server.colonies[colony].state)
+        self.assertEqual(first.view(first_state), expected)
+        self.assertEqual(second.view(second_state), expected)
+        self.assertEqual(expected["resources"]["food"], 1150)
+
+    async def test_slow_subscriber_is_told_it_was_dropped(self):
+        client = await self.connect()
+        colony = (await client.request(op="create"))["colony"]
+        await client.request(op="subscribe", colony=colony)
+        # 上限设为负数时任何订阅者都算接收过慢
+        limit = castle_server.MAX_BUFFERED
+        castle_server.MAX_BUFFERED = -1
+        try:
+            self.server.advance(1)
+        finally:
+            castle_server.MAX_BUFFERED = limit
+        self.server.advance(1)
+        await client.sync()
+        self.assertEqual(client.events, [{"event": "dropped", "colony": colony}])
+        self.assertEqual(self.server.colonies[colony].subscribers, set())
+
+        state = (await client.request(op="subscribe", colony=colony))["state"]
+        self.assertEqual(state["time"], 2)
+
+    async def test_invalid_args_are_rejected(self):
+        client = await self.connect()
+        colony = (await client.request(op="create"))["colony"]
+        state = self.server.colonies[colony].state
+        before = normalized(state)
+        for command, args in [("hire", ["farmer", -100]),
+                              ("hire", ["farmer", 0]),
+                              ("hire", ["farmer", True]),
+                              ("hire", ["farmer", "2"]),
+                              ("hire", ["bogus"]),
+                              ("hire", []),
+                              ("build_house", ["farm", -5]),
+                              ("build_house", ["farm", 1, 7]),
+                              ("build_society", [["农业社"]]),
+                              ("build_research", [None]),
+                              ("switch_branch", [1]),
+                              ("cheat", ["extra"])]:
+            reply = await client.request(op="command", colony=colony, command=command, args=args)
+            self.assertFalse(reply["ok"], (command, args))
+            self.assertIn("无效参数", reply["error"])
+        reply = await client.request(op="command", colony=colony, command="hire", args="farmer")
+        self.assertFalse(reply["ok"])
+        self.assertEqual(normalized(state), before)
+        self.assertEqual(len(self.server.colonies[colony].history.snapshots), 0)
+
+        reply = await client.request(op="command", colony=colony, command="drop_tables")
+        self.assertFalse(reply["ok"])
+        reply = await client.request(op="command", colony=colony + 1, command="cheat")
+        self.assertFalse(reply["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()